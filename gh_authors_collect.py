@@ -16,13 +16,15 @@ Some usage help on PyGithub:
 __author__ = "Sebastian Sardina - ssardina - ssardina@gmail.com"
 __copyright__ = "Copyright 2019-2023"
 
-import base64
 import csv
 import re
+import sys
 import traceback
 import os
+from array import array
 
 from argparse import ArgumentParser
+from operator import itemgetter
 import util
 from typing import List
 
@@ -43,44 +45,15 @@ CSV_HEADER = ["REPO_ID", "AUTHOR", "COMMITS", "ADDITIONS", "DELETIONS"]
 
 GH_URL_PREFIX = "https://github.com/"
 
-IGNORE_USERS = [
-    "ssardina",
-    "web-flow",
-    "github-classroom[bot]",
-    "axelahmer",
-    "AndrewPaulChester",
-]
-
-
-def print_repo_info(repo):
-    # repository full name
-    print("Full name:", repo.full_name)
-    # repository description
-    print("Description:", repo.description)
-    # the date of when the repo was created
-    print("Date created:", repo.created_at)
-    # the date of the last git push
-    print("Date of last push:", repo.pushed_at)
-    # home website (if available)
-    print("Home Page:", repo.homepage)
-    # programming language
-    print("Language:", repo.language)
-    # number of forks
-    print("Number of forks:", repo.forks)
-    # number of stars
-    print("Number of stars:", repo.stargazers_count)
-    print("-" * 50)
-    # repository content (files & directories)
-    print("Contents:")
-    for content in repo.get_contents(""):
-        print(content)
-    try:
-        # repo license
-        print(
-            "License:", base64.b64decode(repo.get_license().content.encode()).decode()
-        )
-    except:
-        pass
+IGNORE_USERS = frozenset(
+    {
+        "ssardina",
+        "web-flow",
+        "github-classroom[bot]",
+        "axelahmer",
+        "AndrewPaulChester",
+    }
+)
 
 
 def traverse_commit(c):
@@ -92,7 +65,9 @@ def traverse_commit(c):
     return set_c
 
 
-def get_stats_contrib_repo(g: Github, repo_name, sha=None, gh_contributions=False):
+def get_stats_contrib_repo(
+    g: Github, repo_name, sha=None, gh_contributions=False, diff_stats=False
+):
     """
     Extracts commit stats for a repo up to some sha/tag by inspecting each commit
     This will even parse commits that have no author login as it will extract base git commit email info
@@ -103,7 +78,9 @@ def get_stats_contrib_repo(g: Github, repo_name, sha=None, gh_contributions=Fals
     :param g: handle to GitHub
     :param repo_name: name of the repository (owner + name)
     :param sha: if given, up to that commit; otherwise parse all branches
-    :return: stats: no of total commits and dicts per author: no of commits, no of additions, no of deletions
+    :param diff_stats: if True, also collect additions/deletions (costs one extra API call per commit)
+    :return: stats: no of total commits and dict per author with array [no of commits, no of additions, no of deletions]
+        (additions/deletions are -1 if not collected)
     """
     # https://pygithub.readthedocs.io/en/latest/github_objects/Repository.html?highlight=tag#github.Repository.Repository.get_git_tag
     repo = g.get_repo(repo_name)
@@ -114,10 +91,8 @@ def get_stats_contrib_repo(g: Github, repo_name, sha=None, gh_contributions=Fals
         x.login for x in repo.get_collaborators() if not x.login in IGNORE_USERS
     ]
 
-    # now count each author contribution
-    author_commits = {}
-    author_additions = {}
-    author_deletions = {}
+    # now count each author contribution: author -> [commits, additions, deletions]
+    author_stats = {}
 
     # method 1: use GH contributions to MAIN
     if gh_contributions:
@@ -126,9 +101,7 @@ def get_stats_contrib_repo(g: Github, repo_name, sha=None, gh_contributions=Fals
                 continue
             author_id = contribution.author.login
 
-            author_commits[author_id] = contribution.total
-            author_additions[author_id] = -1
-            author_deletions[author_id] = -1
+            author_stats[author_id] = array("q", [contribution.total, -1, -1])
     else:
         # method 2: go over each commit in every branch
         #   this wil NOT get missconfigured usernames not correctly linked to GH accounts
@@ -148,27 +121,32 @@ def get_stats_contrib_repo(g: Github, repo_name, sha=None, gh_contributions=Fals
 
         # c is <class 'github.Commit.Commit'> https://pygithub.readthedocs.io/en/latest/github_objects/Commit.html
         for c in repo_commits:
-            try:
-                # c.author is a github.NamedUser.NamedUser - https://pygithub.readthedocs.io/en/latest/github_objects/NamedUser.html#github.NamedUser.NamedUser
-                author_id = c.author.login
-            except Exception as e:
+            # c.author is a github.NamedUser.NamedUser - https://pygithub.readthedocs.io/en/latest/github_objects/NamedUser.html#github.NamedUser.NamedUser
+            author = c.author
+            if author is not None and author.login:
+                # same few authors appear over and over across repos: share one string object
+                author_id = sys.intern(author.login)
+            else:
                 # Commits is not attached to a GitHub account, just get whatever text name was used
                 author_id = f"name({c.commit.author.name})"
 
             if author_id in IGNORE_USERS:
                 continue
 
-            author_commits[author_id] = author_commits.get(author_id, 0) + 1
-            author_additions[author_id] = (
-                author_additions.get(author_id, 0) + c.stats.additions
-            )
-            author_deletions[author_id] = (
-                author_deletions.get(author_id, 0) + c.stats.deletions
-            )
+            stats = author_stats.get(author_id)
+            if stats is None:
+                # -1: additions/deletions not collected (as in method 1), not 0 changes
+                stats = author_stats[author_id] = array(
+                    "q", [0, 0, 0] if diff_stats else [0, -1, -1]
+                )
+            stats[0] += 1
+            if diff_stats:  # c.stats is not in the commit listing, fetched per commit
+                stats[1] += c.stats.additions
+                stats[2] += c.stats.deletions
 
-    no_commits = sum([author_commits[author_id] for author_id in author_commits])
+    no_commits = sum(stats[0] for stats in author_stats.values())
 
-    return no_commits, author_commits, author_additions, author_deletions
+    return no_commits, author_stats
 
 
 def get_stats_contrib_repo_all(g: Github, repo_name):
@@ -178,21 +156,24 @@ def get_stats_contrib_repo_all(g: Github, repo_name):
 
     :param g: handle to GitHub
     :param repo_name: name of the repository (owner + name)
-    :return: stats: no of total commits and dicts per author: no of commits, no of additions, no of deletions
+    :return: stats: no of total commits and dict per author with array [no of commits, no of additions, no of deletions]
     """
     repo = g.get_repo(repo_name)
 
     no_commits = 0
-    author_commits = {}
-    author_additions = {}
-    author_deletions = {}
+    author_stats = {}
     for contrib in repo.get_stats_contributors():
         no_commits += contrib.total
         author_id = contrib.author.login
-        author_commits[author_id] = contrib.total
-        author_additions[author_id] = sum([w.a for w in contrib.weeks])
-        author_deletions[author_id] = sum([w.d for w in contrib.weeks])
-    return no_commits, author_commits, author_additions, author_deletions
+        author_stats[author_id] = array(
+            "q",
+            [
+                contrib.total,
+                sum([w.a for w in contrib.weeks]),
+                sum([w.d for w in contrib.weeks]),
+            ],
+        )
+    return no_commits, author_stats
 
 
 if __name__ == "__main__":
@@ -210,6 +191,11 @@ if __name__ == "__main__":
     parser.add_argument(
         "--tag", help="if given, check up to a given tag (otherwise all repo)."
     )
+    parser.add_argument(
+        "--token",
+        default=os.environ.get("GHTOKEN"),
+        help="GitHub authorization token. Defaults to GHTOKEN env variable.",
+    )
     parser.add_argument(
         "-t",
         "--token-file",
@@ -221,6 +207,11 @@ if __name__ == "__main__":
         action="store_true",
         help="Use GitHub contribution to main stats (Default: %(default)s).",
     )
+    parser.add_argument(
+        "--with-diff-stats",
+        action="store_true",
+        help="Also collect additions/deletions per author; requires one extra API call per commit (Default: %(default)s).",
+    )
     args = parser.parse_args()
 
     # Get the list of TEAM + GIT REPO links from csv file
@@ -233,11 +224,14 @@ if __name__ == "__main__":
         exit(0)
 
     # Authenticate to GitHub
-    if not args.token_file and not (args.user or args.password):
-        logging.error("No authentication provided, quitting....")
+    if not args.token_file and not args.token:
+        logging.error(
+            "No token or token file for authentication provided, quitting...."
+        )
         exit(1)
     try:
-        g = util.open_gitHub(token_file=args.token_file)
+        g = util.open_gitHub(token=args.token, token_file=args.token_file)
+        util.log_rate_limit(g)
     except:
         logging.error(
             "Something wrong happened during GitHub authentication. Check credentials."
@@ -252,16 +246,20 @@ if __name__ == "__main__":
         repo_url = f"https://github.com/{repo_name}"
         logging.info(f"Processing repo {repo_id} ({repo_url})...")
         try:
-            no_commits, author_commits, author_add, author_del = get_stats_contrib_repo(
-                g, r["REPO_NAME"], sha=args.tag, gh_contributions=args.gh_contributions
+            no_commits, author_stats = get_stats_contrib_repo(
+                g,
+                r["REPO_NAME"],
+                sha=args.tag,
+                gh_contributions=args.gh_contributions,
+                diff_stats=args.with_diff_stats,
             )
         except Exception as e:
             logging.info(f"\t Exception repo {repo_id}: {e}")
             continue
         logging.info(
-            f"\t Repo {repo_id} has {no_commits} commits from {len(author_commits)} authors."
+            f"\t Repo {repo_id} has {no_commits} commits from {len(author_stats)} authors."
         )
-        authors_stats.append((repo_id, author_commits, author_add, author_del))
+        authors_stats.append((repo_id, author_stats))
 
     # Produce/Update CSV file output with all repos if requested via option --csv
     # first check if we are updating a file
@@ -269,33 +267,30 @@ if __name__ == "__main__":
     if os.path.exists(args.CSV_OUT):
         logging.info(f"Updating teams in existing CSV file *{args.CSV_OUT}*.")
         with open(args.CSV_OUT, "r") as f:
-            csv_reader = csv.DictReader(f, fieldnames=CSV_HEADER)
+            csv_reader = csv.reader(f)
 
             next(csv_reader)  # skip header
             for row in csv_reader:
-                if args.repos is not None and row["REPO_ID"] not in args.repos:
-                    rows_to_csv.append(row)
+                # row = (REPO_ID, AUTHOR, COMMITS, ADDITIONS, DELETIONS)
+                if args.repos is not None and row[0] not in args.repos:
+                    rows_to_csv.append(tuple(row))
     else:
         logging.info(
             f"List of author stats will be saved to CSV file *{args.CSV_OUT}*."
         )
 
     # next build the rows for the repo inspected for update
-    for x in authors_stats:  # x = (repo_name, dict_authors_commits)
-        for author in x[1]:
-            row = {}
-            row["REPO_ID"] = x[0]
-            row["AUTHOR"] = author
-            row["COMMITS"] = x[1][author]
-            row["ADDITIONS"] = x[2][author]
-            row["DELETIONS"] = x[3][author]
-            rows_to_csv.append(row)
+    rows_to_csv.extend(
+        (repo_id, author, stats[0], stats[1], stats[2])
+        for repo_id, author_stats in authors_stats
+        for author, stats in author_stats.items()
+    )
 
     # sort by repo id first, then author
-    rows_to_csv.sort(key=lambda x: (x["REPO_ID"], x["AUTHOR"]))
+    rows_to_csv.sort(key=itemgetter(0, 1))
 
     # finally, write to csv the whole pack of rows (old and updated)
     with open(args.CSV_OUT, "w") as output_csv_file:
-        csv_writer = csv.DictWriter(output_csv_file, fieldnames=CSV_HEADER)
-        csv_writer.writeheader()
+        csv_writer = csv.writer(output_csv_file)
+        csv_writer.writerow(CSV_HEADER)
         csv_writer.writerows(rows_to_csv)
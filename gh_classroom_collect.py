@@ -12,12 +12,13 @@ Some usage help on PyGithub:
 __author__ = "Sebastian Sardina - ssardina - ssardina@gmail.com"
 __copyright__ = "Copyright 2019-2024"
 
-import base64
 import csv
+import json
 import re
-import traceback
+import sys
 
 from argparse import ArgumentParser
+from itertools import chain
 from github import GithubException
 import logging
 import util
@@ -27,6 +28,63 @@ import time
 
 CSV_GITHUB_USERNAME = "github_username"
 CSV_GITHUB_IDENTIFIER = "identifier"
+REPOS_HEADER_CSV = [
+    "ORG_NAME",
+    "ASSIGNMENT",
+    "REPO_ID",
+    "REPO_NAME",
+    "REPO_URL",
+    "REPO_HTTP",
+]
+# a field with any of these needs csv quoting
+CSV_SPECIAL_CHARS = re.compile(r'[,"\r\n]')
+
+# only ask for the fields we need, 100 repos per request (max allowed)
+GRAPHQL_ORG_REPOS = """
+query($org: String!, $cursor: String) {
+  organization(login: $org) {
+    repositories(first: 100, after: $cursor) {
+      pageInfo { endCursor hasNextPage }
+      nodes { nameWithOwner sshUrl url }
+    }
+  }
+}
+"""
+
+# search is done in the server, so only the (few) repos of the assignment are transferred
+GRAPHQL_SEARCH_REPOS = """
+query($query: String!, $cursor: String) {
+  search(query: $query, type: REPOSITORY, first: 100, after: $cursor) {
+    repositoryCount
+    pageInfo { endCursor hasNextPage }
+    nodes { ... on Repository { nameWithOwner sshUrl url } }
+  }
+}
+"""
+SEARCH_MAX_RESULTS = 1000  # GitHub search never returns more results than this
+SEARCH_QUERY = "org:{org} {prefix} in:name fork:true"
+
+# cheap check to know if the repos have changed since last run:
+#   number of repos and last repo updated (changes if repos are added or renamed)
+GRAPHQL_ORG_FINGERPRINT = """
+query($org: String!) {
+  organization(login: $org) {
+    repositories(first: 1, orderBy: {field: UPDATED_AT, direction: DESC}) {
+      totalCount
+      nodes { nameWithOwner updatedAt }
+    }
+  }
+}
+"""
+GRAPHQL_SEARCH_FINGERPRINT = """
+query($query: String!) {
+  search(query: $query, type: REPOSITORY, first: 1) {
+    repositoryCount
+    nodes { ... on Repository { nameWithOwner updatedAt } }
+  }
+}
+"""
+CACHE_DIR = os.path.expanduser("~/.cache/gh_classroom_collect")
 
 logging.basicConfig(
     format="%(asctime)s %(levelname)-8s %(message)s",
@@ -34,46 +92,159 @@ logging.basicConfig(
     datefmt="%a, %d %b %Y %H:%M:%S",
 )
 
-import datetime
-import pytz
-
-DATE_FORMAT = "%-d/%-m/%Y %-H:%-M:%-S"  # RMIT Uni (Australia)
-TIMEZONE = pytz.timezone("Australia/Melbourne")
-
-
-def get_time_now():
-    return datetime.datetime.now(tz=TIMEZONE).strftime("%Y-%m-%d-%H-%M-%S")
-
-
-def print_repo_info(repo):
-    # repository full name
-    print("Full name:", repo.full_name)
-    # repository description
-    print("Description:", repo.description)
-    # the date of when the repo was created
-    print("Date created:", repo.created_at)
-    # the date of the last git push
-    print("Date of last push:", repo.pushed_at)
-    # home website (if available)
-    print("Home Page:", repo.homepage)
-    # programming language
-    print("Language:", repo.language)
-    # number of forks
-    print("Number of forks:", repo.forks)
-    # number of stars
-    print("Number of stars:", repo.stargazers_count)
-    print("-" * 50)
-    # repository content (files & directories)
-    print("Contents:")
-    for content in repo.get_contents(""):
-        print(content)
-    try:
-        # repo license
-        print(
-            "License:", base64.b64decode(repo.get_license().content.encode()).decode()
+
+def fetch_repos_graphql(org, token):
+    """
+    Yield all the repos of an organization via GitHub GraphQL API
+
+    This is much cheaper than PyGithub's org.get_repos(): one request per
+    100 repos and only the fields needed are transferred.
+
+    :param org: name of the organization
+    :param token: GitHub token to authenticate
+    :return: generator of dicts with keys nameWithOwner, sshUrl, url
+    """
+    cursor = None
+    while True:
+        data = util.gh_graphql(token, GRAPHQL_ORG_REPOS, {"org": org, "cursor": cursor})
+        repos = data["organization"]["repositories"]
+        yield from repos["nodes"]
+        if not repos["pageInfo"]["hasNextPage"]:
+            break
+        cursor = repos["pageInfo"]["endCursor"]
+
+
+def search_repos_graphql(org, prefix, token):
+    """
+    Yield the repos of an organization whose name contains the prefix, using GitHub search
+
+    Search matches words anywhere in the name, so results still need to be
+    filtered locally. If there are more repos than search can return, fall
+    back to listing all the repos of the organization.
+
+    :param org: name of the organization
+    :param prefix: prefix of the assignment repos
+    :param token: GitHub token to authenticate
+    :return: generator of dicts with keys nameWithOwner, sshUrl, url
+    """
+    query = SEARCH_QUERY.format(org=org, prefix=prefix)
+    cursor = None
+    while True:
+        data = util.gh_graphql(
+            token, GRAPHQL_SEARCH_REPOS, {"query": query, "cursor": cursor}
         )
-    except:
-        pass
+        search = data["search"]
+        if search["repositoryCount"] > SEARCH_MAX_RESULTS:
+            logging.warning(
+                f"Too many repos matching *{prefix}* for search ({search['repositoryCount']}); listing all organization repos."
+            )
+            yield from fetch_repos_graphql(org, token)
+            return
+        yield from search["nodes"]
+        if not search["pageInfo"]["hasNextPage"]:
+            break
+        cursor = search["pageInfo"]["endCursor"]
+
+
+def get_fingerprint(org, prefixes, token, search=False):
+    """
+    Get a cheap fingerprint of the repos of an organization: their number and
+    the last one updated (of each prefix if using search, of all repos otherwise)
+
+    :param org: name of the organization
+    :param prefixes: prefixes of the assignment repos
+    :param token: GitHub token to authenticate
+    :param search: if True, fingerprint the repos found by search
+    :return: list with the fingerprint (JSON serializable)
+    """
+    if not search:
+        repos = util.gh_graphql(token, GRAPHQL_ORG_FINGERPRINT, {"org": org})[
+            "organization"
+        ]["repositories"]
+        return [repos["totalCount"], repos["nodes"]]
+
+    fingerprint = []
+    for prefix in prefixes:
+        query = SEARCH_QUERY.format(org=org, prefix=prefix)
+        found = util.gh_graphql(
+            token,
+            GRAPHQL_SEARCH_FINGERPRINT,
+            {"query": f"{query} sort:updated-desc"},
+        )["search"]
+        fingerprint.append([found["repositoryCount"], found["nodes"]])
+    return fingerprint
+
+
+def get_repos(org, prefixes, token, refresh=False, cache_ttl=0, search=False):
+    """
+    Yield the repos of an organization matching the prefixes, re-using the ones
+    cached on disk in the last run if they are recent (less than cache_ttl
+    minutes old, if given) or the repos have not changed
+
+    By default all the repos of the organization are listed, as GitHub search
+    indexes new repos with a delay and may miss those created just before a
+    deadline; search transfers less but is only used if asked for.
+
+    GraphQL does not support conditional requests (ETag), so a fingerprint of
+    the repos (their number and the last one updated) is used to validate an
+    old cache. Use refresh to always get the repos from GitHub.
+
+    :param org: name of the organization
+    :param prefixes: prefixes of the assignment repos
+    :param token: GitHub token to authenticate
+    :param refresh: if True, ignore the cache
+    :param cache_ttl: minutes a cache is used without even checking GitHub (0: always check)
+    :param search: if True, find the repos using GitHub search
+    :return: generator of dicts with keys nameWithOwner, sshUrl, url
+    """
+    cache_file = os.path.join(
+        CACHE_DIR,
+        f"{org}-{','.join(sorted(prefixes))}{'-search' if search else ''}.json",
+    )
+
+    cache = None
+    if not refresh and os.path.exists(cache_file):
+        with open(cache_file, "r") as f:
+            cache = json.load(f)
+        age = (time.time() - cache.get("time", 0)) / 60
+        if age < cache_ttl:
+            logging.warning(
+                f"Using cached repos in {cache_file} ({age:.0f} minutes old) WITHOUT checking GitHub; repos created since then may be missing (use --refresh to avoid)."
+            )
+            yield from cache["repos"]
+            return
+
+    fingerprint = get_fingerprint(org, prefixes, token, search)
+    if cache is not None and cache.get("fingerprint") == fingerprint:
+        logging.warning(
+            f"No changes in repos since last run (checked in GitHub), using cached repos in {cache_file}."
+        )
+        cache["time"] = time.time()
+        with open(cache_file, "w") as f:
+            json.dump(cache, f)
+        yield from cache["repos"]
+        return
+
+    if search:
+        found = chain.from_iterable(
+            search_repos_graphql(org, prefix, token) for prefix in prefixes
+        )
+    else:
+        name_prefixes = tuple(f"{org}/{prefix}-".lower() for prefix in prefixes)
+        found = (
+            repo
+            for repo in fetch_repos_graphql(org, token)
+            if repo["nameWithOwner"].lower().startswith(name_prefixes)
+        )
+
+    repos = []
+    for repo in found:
+        repos.append(repo)
+        yield repo
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(cache_file, "w") as f:
+        json.dump({"fingerprint": fingerprint, "time": time.time(), "repos": repos}, f)
 
 
 if __name__ == "__main__":
@@ -82,7 +253,10 @@ if __name__ == "__main__":
         "CSV HEADERS: ORG_NAME, ASSIGNMENT, REPO_ID, REPO_NAME, REPO_GIT"
     )
     parser.add_argument("ORG_NAME", help="Organization name for GitHub Classroom")
-    parser.add_argument("ASSIGNMENT_PREFIX", help="Prefix string for the assignment.")
+    parser.add_argument(
+        "ASSIGNMENT_PREFIX",
+        help="Prefix string for the assignment (comma-separated for many assignments).",
+    )
     parser.add_argument("CSV", help="CSV file where to store the set of repo links.")
     parser.add_argument(
         "--token",
@@ -100,12 +274,43 @@ if __name__ == "__main__":
         help=f"CSV file mapping repo suffix ({CSV_GITHUB_USERNAME}) to "
         f"student ids ({CSV_GITHUB_IDENTIFIER}).",
     )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        default=False,
+        help="Print detailed info of each repo found; 3 extra API calls per repo (Default: %(default)s).",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        default=False,
+        help=f"Do not use the repos cached in {CACHE_DIR} (Default: %(default)s).",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=int,
+        default=0,
+        help="Minutes the cached repos are used without checking GitHub at all; "
+        "new repos are missed meanwhile (Default: %(default)s, always check).",
+    )
+    parser.add_argument(
+        "--search",
+        action="store_true",
+        default=False,
+        help="Find the repos with GitHub search instead of listing all the organization repos; "
+        "less data, but repos created in the last minutes may be missed (Default: %(default)s).",
+    )
     args = parser.parse_args()
     print(args)
-    print(f"Running the script on: {get_time_now()}", flush=True)
+    print(f"Running the script on: {util.get_time_now()}", flush=True)
 
-    REPO_URL_PATTERN = re.compile(
-        r"^{}/{}-(.*)$".format(args.ORG_NAME, args.ASSIGNMENT_PREFIX)
+    # repos of the assignments are named ORG_NAME/ASSIGNMENT_PREFIX-<suffix>
+    # one regex for all prefixes; longest first so p1-extra-xxx is not taken as extra-xxx of p1
+    prefixes = sorted(args.ASSIGNMENT_PREFIX.split(","), key=len, reverse=True)
+    REPO_NAME_PATTERN = re.compile(
+        r"^{}/({})-(.*)$".format(
+            re.escape(args.ORG_NAME), "|".join(map(re.escape, prefixes))
+        )
     )
 
     ###############################################
@@ -117,7 +322,9 @@ if __name__ == "__main__":
         )
         exit(1)
     try:
-        g = util.open_gitHub(token=args.token, token_file=args.token_file)
+        token = util.read_token(token_file=args.token_file, token=args.token)
+        g = util.open_gitHub(token=token)
+        util.log_rate_limit(g)
     except:
         logging.error(
             "Something wrong happened during GitHub authentication. Check credentials."
@@ -129,10 +336,11 @@ if __name__ == "__main__":
     user_to_id_map = dict()
     if args.student_map:
         with open(args.student_map, "r") as file:
-            csv_content = csv.DictReader(file)
-            for row in csv_content:
-                row = dict(row)
-                user_to_id_map[row[CSV_GITHUB_USERNAME]] = row[CSV_GITHUB_IDENTIFIER]
+            csv_reader = csv.reader(file)
+            header = next(csv_reader)
+            col_user = header.index(CSV_GITHUB_USERNAME)
+            col_id = header.index(CSV_GITHUB_IDENTIFIER)
+            user_to_id_map = {row[col_user]: row[col_id] for row in csv_reader}
     else:
         logging.info(
             "No GitHub individual mapping provided. Team assignment; using suffix repo as identifier."
@@ -144,67 +352,80 @@ if __name__ == "__main__":
         )
     )
 
-    # Get the repos of the organization and extract the ones matching the assignment prefix
-    try:
-        org = g.get_organization(args.ORG_NAME)
-        org_repos = org.get_repos()
-    except GithubException as e:
-        logging.error(
-            "There was an error trying to get the repos for organization {} "
-            "(is the organization spelled correctly?): {}".format(args.ORG_NAME, e.data)
-        )
-        traceback.print_exc()
-        exit(1)
-
-    # collect all repos in the organization with the assignment prefix
-    repos_select = []
+    # Get the repos of the organization matching the assignment prefix and
+    # write each to the CSV file as soon as it is found (no need to keep them all)
+    #   rows go to a temp file that replaces the CSV file only if all repos are got,
+    #   so an error half way does not leave a truncated CSV file
+    logging.info(f"List of repos will be saved to CSV file *{args.CSV}*.")
     count = 0
-    for repo in org_repos:
-        match = re.match(REPO_URL_PATTERN, repo.full_name)
-        if match:
-            # repo_url = 'git@github.com:{}'.format(repo.full_name)
-            count += 1
-            print(f"Found repo {repo.full_name}")
-            repos_select.append(
-                {
-                    "REPO_SUFFIX": match.group(1),
-                    "REPO_NAME": repo.full_name,
-                    "REPO_URL": repo.ssh_url,
-                    "REPO_HTTP": repo.html_url,
-                }
-            )
-    print(f"Number of repos found with prefix *{args.ASSIGNMENT_PREFIX}*:", count)
+    seen = set()  # the search for a prefix may also give repos of another prefix
+    tmp_csv = f"{args.CSV}.tmp"  # same directory, so os.replace() is atomic
+    with open(tmp_csv, "w") as output_csv_file:
+        csv_writer = csv.writer(output_csv_file)
+        csv_writer.writerow(REPOS_HEADER_CSV)
+        row_start = f"{args.ORG_NAME},"  # same in every row
 
-    # Produce CSV file output with all repos if requested via option --csv
-    logging.info(f"List of repos will be saved to CSV file *{args.CSV}*.")
-    with open(args.CSV, "w") as output_csv_file:
-        csv_writer = csv.DictWriter(
-            output_csv_file,
-            fieldnames=[
-                "ORG_NAME",
-                "ASSIGNMENT",
-                "REPO_ID",
-                "REPO_NAME",
-                "REPO_URL",
-                "REPO_HTTP",
-            ],
-        )
-        csv_writer.writeheader()
-
-        # for each repo in repo_select produce a row in the CSV file, add the team name from mapping
-        for row in repos_select:
-            # if there is a mapping from a repo suffix to a REPO_ID, do it; otherwise use SUFFIX directly
-            if args.student_map:
-                if row["REPO_SUFFIX"] in user_to_id_map.keys():
-                    row["REPO_SUFFIX"] = user_to_id_map[row["REPO_SUFFIX"]]
+        try:
+            # fetch repos from GitHub in the background while writing them here
+            for repo in util.iter_prefetch(
+                get_repos(
+                    args.ORG_NAME,
+                    prefixes,
+                    token,
+                    args.refresh,
+                    args.cache_ttl,
+                    args.search,
+                )
+            ):
+                repo_name = repo["nameWithOwner"]
+                match = REPO_NAME_PATTERN.match(repo_name)
+                if not match or repo_name in seen:
+                    continue
+                seen.add(repo_name)
+                count += 1
+                print(f"Found repo {repo_name}")
+                if args.verbose:
+                    util.print_repo_info(g.get_repo(repo_name), contents=True)
+
+                # if there is a mapping from a repo suffix to a REPO_ID, do it; otherwise use SUFFIX directly
+                assignment, repo_suffix = match.groups()
+                if args.student_map:
+                    repo_id = user_to_id_map.get(repo_suffix)
+                    if repo_id is not None:
+                        repo_suffix = repo_id
+                    else:
+                        logging.warning(
+                            f"Repo {repo_name} with suffix {repo_suffix} has no mapping. Using suffix directly."
+                        )
+
+                # GitHub names and URLs never need quoting, but ids from the map may
+                repo_id = repo_suffix.lower()
+                if CSV_SPECIAL_CHARS.search(repo_id):
+                    csv_writer.writerow(
+                        (
+                            args.ORG_NAME,
+                            assignment,
+                            repo_id,
+                            repo_name,
+                            repo["sshUrl"],
+                            repo["url"],
+                        )
+                    )
                 else:
-                    logging.warning(
-                        f"Repo {row['REPO_NAME']} with suffix {row['REPO_SUFFIX']} has no mapping. Using suffix directly."
+                    output_csv_file.write(
+                        f"{row_start}{assignment},{repo_id},{repo_name},{repo['sshUrl']},{repo['url']}\r\n"
                     )
-
-            row["ORG_NAME"] = args.ORG_NAME
-            row["ASSIGNMENT"] = args.ASSIGNMENT_PREFIX
-            row["REPO_ID"] = row.pop(
-                "REPO_SUFFIX"
-            ).lower()  # rename key REPO_SUFFIX to REPO_ID in the dictionary
-            csv_writer.writerow(row)
+        except GithubException as e:
+            logging.exception(
+                "There was an error trying to get the repos for organization %s "
+                "(is the organization spelled correctly?): %s",
+                args.ORG_NAME,
+                e.data,
+            )
+            os.remove(tmp_csv)
+            sys.exit(1)
+        except BaseException:
+            os.remove(tmp_csv)
+            raise
+    os.replace(tmp_csv, args.CSV)
+    print(f"Number of repos found with prefix *{args.ASSIGNMENT_PREFIX}*:", count)
@@ -64,18 +64,24 @@ if __name__ == '__main__':
         print(f'\t*** Wiki name: {wiki_repo}')
 
         # fresh clone of student wiki repo into folder WIKI_DIR/
+        #   only the last 2 commits are needed to decide if it has been edited
         if os.path.exists(WIKI_DIR):
             shutil.rmtree(WIKI_DIR)
-        repo = git.Repo.clone_from(wiki_repo, WIKI_DIR)
+        try:
+            repo = git.Repo.clone_from(wiki_repo, WIKI_DIR, depth=2)
+        except git.GitCommandError as e:
+            print(f'\t\t Error cloning wiki of repo {r["REPO_NAME"]}: {e.stderr.strip()}')
+            continue
 
-        commits = list(repo.iter_commits("master", max_count=5))
+        commits = list(repo.iter_commits("master", max_count=2))
 
         #  should we skip the repo?
         skip = len(commits) > 1
         # skip = len(commits) > 1 or first_commit_name != 'Sebastian Sardina'
         
         if args.force or not skip:
-            os.system(f"cp -rf {args.WIKI_TEMPLATE}/* {WIKI_DIR}/")
+            shutil.copytree(args.WIKI_TEMPLATE, WIKI_DIR, dirs_exist_ok=True,
+                            ignore=shutil.ignore_patterns('.git'))
             repo.index.add(['*'])
             repo.index.commit('Init Wiki template. Enjoy!')
             try:
@@ -15,10 +15,10 @@ __copyright__ = "Copyright 2024"
 
 import os
 import logging
-import datetime
-import pytz
 
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from github import GithubException
 
 import util
 
@@ -32,12 +32,29 @@ logging.basicConfig(
 )
 
 
-DATE_FORMAT = "%-d/%-m/%Y %-H:%-M:%-S"  # RMIT Uni (Australia)
-TIMEZONE = pytz.timezone("Australia/Melbourne")
+def update_membership(team, user, delete=False, dry_run=False):
+    """
+    Add (as member) or delete a user to/from a GitHub team
 
-
-def get_time_now():
-    return datetime.datetime.now(tz=TIMEZONE).strftime("%Y-%m-%d-%H-%M-%S")
+    :param team: the github.Team.Team object
+    :param user: the github.NamedUser.NamedUser object
+    :param delete: if True, remove the user from the team; otherwise add it
+    :param dry_run: if True, do not do any actual change
+    :return: True if updated, False if the update failed
+    """
+    try:
+        if not delete:
+            print(f"Adding user **{user.login}** to team {team.name}")
+            if not dry_run:
+                team.add_membership(user, role="member")
+        else:
+            print(f"Deleting user **{user.login}** to team {team.name}")
+            if not dry_run:
+                team.remove_membership(user)
+    except GithubException as e:
+        logging.error(f"Failed to update user {user.login} in team {team.name}: {e}")
+        return False
+    return True
 
 
 if __name__ == "__main__":
@@ -46,11 +63,10 @@ if __name__ == "__main__":
     )
     parser.add_argument("ORG_NAME", help="Organization name for GitHub Classroom")
     parser.add_argument("USERNAME", help="Prefix string for the assignment.")
-    parser.add_argument("-u", "--user", help="GitHub username.")
     parser.add_argument(
         "-t",
         "--token",
-        default=os.environ["GHTOKEN"] if os.environ["GHTOKEN"] is not None else None,
+        default=os.environ.get("GHTOKEN"),
         help="File containing GitHub authorization token/password. Defaults to GHTOKEN env variable.",
     )
     parser.add_argument(
@@ -58,7 +74,6 @@ if __name__ == "__main__":
         "--token-file",
         help="File containing GitHub authorization token/password.",
     )
-    parser.add_argument("-p", "--password", help="GitHub username's password.")
     parser.add_argument(
         "--teams", nargs="+", help="Teams to add the user (white list)."
     )
@@ -78,6 +93,12 @@ if __name__ == "__main__":
         default=False,
         help="Do not do any actual changes, run in dry-run mode (Default: %(default)s)",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="number of teams updated concurrently (Default: %(default)s).",
+    )
     parser.add_argument(
         "-l",
         "--list",
@@ -87,18 +108,16 @@ if __name__ == "__main__":
     )
     args = parser.parse_args()
     print(args)
-    print(f"Running the script on: {get_time_now()}", flush=True)
+    print(f"Running the script on: {util.get_time_now()}", flush=True)
 
-    if not args.token_file and not args.token and not (args.user or args.password):
-        logging.error("No authentication provided, quitting....")
+    if not args.token_file and not args.token:
+        logging.error(
+            "No token or token file for authentication provided, quitting...."
+        )
         exit(1)
     try:
-        g = util.open_gitHub(
-            token=args.token,
-            token_file=args.token_file,
-            user=args.user,
-            password=args.password,
-        )
+        g = util.open_gitHub(token=args.token, token_file=args.token_file)
+        util.log_rate_limit(g)
     except Exception:
         logging.error("Something went wrong during GitHub authentication.")
         exit(1)
@@ -109,26 +128,42 @@ if __name__ == "__main__":
     logging.info(f"Getting GH user for {args.USERNAME}...")
     user = g.get_user(args.USERNAME)
 
-    # collect and list all teams
-    teams = []
-    for t in org.get_teams():
-        teams.append(t.name)
-    print(f"Teams available: {len(teams)}", teams)
+    # collect and list all teams (only once, they are used below again)
+    # https://pygithub.readthedocs.io/en/stable/github_objects/Organization.html#github.Organization.Organization.get_teams
+    teams = list(org.get_teams())
+    print(f"Teams available: {len(teams)}", [t.name for t in teams])
     if args.list:
         exit(0)
 
-    # go through all the teams and add/delete user from them as needed
-    # https://pygithub.readthedocs.io/en/stable/github_objects/Organization.html#github.Organization.Organization.get_teams
-    for t in org.get_teams():
-        if args.nteams and t.name in args.nteams:
-            continue
-        if not args.nteams and args.teams and t.name not in args.teams:
-            continue
-        if not args.delete:
-            print(f"Adding user **{args.USERNAME}** to team {t.name}")
-            if not args.dry_run:
-                t.add_membership(user, role="member")
-        else:
-            print(f"Deleting user **{args.USERNAME}** to team {t.name}")
-            if not args.dry_run:
-                t.remove_membership(user)
+    teams_white = set(args.teams) if args.teams else None
+    teams_black = set(args.nteams) if args.nteams else None
+
+    # select the teams to add/delete user from
+    teams = [
+        t
+        for t in teams
+        if not (teams_black and t.name in teams_black)
+        and (teams_black or not teams_white or t.name in teams_white)
+    ]
+
+    # teams are independent: update them concurrently, as it is all waiting on GitHub
+    no_errors = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(update_membership, t, user, args.delete, args.dry_run): t
+            for t in teams
+        }
+        # failures are collected here, in the main thread, so none goes unnoticed
+        for future in as_completed(futures):
+            try:
+                if not future.result():
+                    no_errors += 1
+            except Exception as e:
+                logging.error(
+                    f"Failed to update user {user.login} in team {futures[future].name}: {e}"
+                )
+                no_errors += 1
+
+    logging.info(
+        f"Finished! Total teams: {len(teams)} - Failed to update: {no_errors}."
+    )
@@ -18,6 +18,7 @@ import csv
 import os
 
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import util
 from typing import List
 
@@ -27,15 +28,8 @@ from github import Github, Repository, Organization, GithubException
 import logging
 import coloredlogs
 
-# get the TIMEZONE to be used - works with Python < 3.9 via pytz and 3.9 via ZoneInfo
-TIMEZONE_STR = "Australia/Melbourne"
 from datetime import datetime
-
-# this should work Python 3.9+
-from zoneinfo import ZoneInfo
-
-TIMEZONE = ZoneInfo(TIMEZONE_STR)
-
+from util import TIMEZONE
 
 LOGGING_FMT = "%(asctime)s %(levelname)-8s %(message)s"
 LOGGING_DATE = "%a, %d %b %Y %H:%M:%S"
@@ -48,15 +42,34 @@ CSV_HEADER = ["REPO_ID", "AUTHOR", "COMMITS", "ADDITIONS", "DELETIONS"]
 
 GH_URL_PREFIX = "https://github.com/"
 
-CSV_MERGED = "pr_forced.csv"
+CSV_MERGED = "pr_merged.csv"
 CSV_FORCED_PUSH = "pr_forced_push.csv"
 
+# merged status and force pushes of the Feedback PR #1 of a repo
+GRAPHQL_PR_FEEDBACK = """
+    pullRequest(number: 1) {
+      merged
+      timelineItems(itemTypes: [HEAD_REF_FORCE_PUSHED_EVENT], first: 1) { totalCount }
+    }
+"""
+
+
+def get_prs_feedback(token, repo_names):
+    """
+    Get the Feedback PR #1 of a batch of repos with a single GitHub GraphQL query
 
-def backup_file(file_path: str):
-    if os.path.exists(file_path):
-        logging.info(f"Backing up {file_path}...")
-        time_now = util.get_time_now()
-        os.rename(file_path, f"{file_path}-{time_now}.bak")
+    One request answers, for all the repos, whether the PR was merged and
+    whether it was force pushed, instead of 2+ REST calls per repo (the PR and
+    all the pages of its events).
+
+    :param token: GitHub token to authenticate
+    :param repo_names: list of repo names (owner + name)
+    :return: list with the PR data of each repo (None if repo/PR could not be got)
+    """
+    return [
+        (repo or {}).get("pullRequest")
+        for repo in util.gh_graphql_repos(token, repo_names, GRAPHQL_PR_FEEDBACK)
+    ]
 
 
 if __name__ == "__main__":
@@ -65,6 +78,17 @@ if __name__ == "__main__":
     parser.add_argument(
         "--repos", nargs="+", help="if given, only the teams specified will be parsed."
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="number of GraphQL requests run concurrently (Default: %(default)s).",
+    )
+    parser.add_argument(
+        "--token",
+        default=os.environ.get("GHTOKEN"),
+        help="GitHub authorization token. Defaults to GHTOKEN env variable.",
+    )
     parser.add_argument(
         "-t",
         "--token-file",
@@ -87,11 +111,14 @@ if __name__ == "__main__":
     ###############################################
     # Authenticate to GitHub
     ###############################################
-    if not args.token_file and not (args.user or args.password):
-        logging.error("No authentication provided, quitting....")
+    if not args.token_file and not args.token:
+        logging.error(
+            "No token or token file for authentication provided, quitting...."
+        )
         exit(1)
     try:
-        g = util.open_gitHub(token_file=args.token_file)
+        g = util.open_gitHub(token=args.token, token_file=args.token_file)
+        util.log_rate_limit(g)
     except:
         logging.error(
             "Something wrong happened during GitHub authentication. Check credentials."
@@ -101,54 +128,66 @@ if __name__ == "__main__":
     ###############################################
     # Process each repo in list_repos
     ###############################################
-    authors_stats = []
+    token = util.read_token(token_file=args.token_file, token=args.token)
     no_repos = len(list_repos)
-    no_merged = 0
     no_errors = 0
     merged_pr = []
     forced_pr = []  # repos that have forced push
-    for k, r in enumerate(list_repos):
-        repo_id = r["REPO_ID"]
-        repo_name = r["REPO_NAME"]
-        repo_url = f"https://github.com/{repo_name}"
-        logging.info(f"Processing repo {k}/{no_repos}: {repo_id} ({repo_url})...")
-
-        repo = g.get_repo(repo_name)
-        try:
-            pr_feedback = repo.get_pull(number=1)  # get the first PR - feedback
-            if pr_feedback.merged:
-                logging.info(f"\t PR Feedback merged!!! {pr_feedback}")
-                merged_pr.append(repo_id)
-
-            # check for forced push
-            for event in pr_feedback.get_issue_events():
-                if event.event == "head_ref_force_pushed":
-                    logging.warning(f"\t PR Feedback force pushed!!! {pr_feedback}")
-                    forced_pr.append(repo_id)
-                    break
-        except GithubException as e:
-            logging.error(f"\t Error in repo {repo_name}: {e}")
-            no_errors += 1
+
+    # results are written as they arrive, so a crash keeps what was checked
+    util.backup_file(CSV_MERGED)
+    util.backup_file(CSV_FORCED_PUSH)
+    with open(CSV_MERGED, "w", newline="") as file_merged, open(
+        CSV_FORCED_PUSH, "w", newline=""
+    ) as file_forced:
+        writer_merged = csv.writer(file_merged)
+        writer_merged.writerow(["REPO_ID"])
+        writer_forced = csv.writer(file_forced)
+        writer_forced.writerow(["REPO_ID"])
+
+        # batches are independent: check them concurrently, as it is all waiting on GitHub
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            futures = {}
+            for k in range(0, no_repos, util.GH_GRAPHQL_BATCH_SIZE):
+                batch = list_repos[k : k + util.GH_GRAPHQL_BATCH_SIZE]
+                logging.info(f"Processing repos {k}-{k + len(batch) - 1}/{no_repos}...")
+                repo_names = [r["REPO_NAME"] for r in batch]
+                future = executor.submit(get_prs_feedback, token, repo_names)
+                futures[future] = (k, batch)
+
+            # results are collected here, in the main thread, so no locking is needed
+            for future in as_completed(futures):
+                k, batch = futures[future]
+                try:
+                    prs_feedback = future.result()
+                except GithubException as e:
+                    logging.error(f"\t Error in repos {k}-{k + len(batch) - 1}: {e}")
+                    no_errors += len(batch)
+                    continue
+
+                for r, pr_feedback in zip(batch, prs_feedback):
+                    repo_id = r["REPO_ID"]
+                    repo_name = r["REPO_NAME"]
+                    if pr_feedback is None:
+                        logging.error(
+                            f"\t Error in repo {repo_name}: no PR Feedback found"
+                        )
+                        no_errors += 1
+                        continue
+                    if pr_feedback["merged"]:
+                        logging.info(f"\t PR Feedback merged!!! {repo_name}")
+                        merged_pr.append(repo_id)
+                        writer_merged.writerow([repo_id])
+                    if pr_feedback["timelineItems"]["totalCount"] > 0:
+                        logging.warning(f"\t PR Feedback force pushed!!! {repo_name}")
+                        forced_pr.append(repo_id)
+                        writer_forced.writerow([repo_id])
+                file_merged.flush()
+                file_forced.flush()
 
     logging.info(
         f"Finished! Total repos: {no_repos} - Merged/foced wrongly: {len(merged_pr)}/{len(forced_pr)} - Errors: {no_errors}."
     )
     logging.info(f"Repos that closed the Feedback PR: \n\t {merged_pr}.")
     logging.info(f"Repos that have forced push: \n\t {forced_pr}.")
-
-    # Write merged_pr data to CSV file
-    backup_file(CSV_MERGED)
-    merged_pr.sort()
-    with open(CSV_MERGED, "w", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow(["REPO_ID"])
-        writer.writerows([[repo_id] for repo_id in merged_pr])
-
-    backup_file(CSV_FORCED_PUSH)
-    forced_pr.sort()
-    with open(CSV_FORCED_PUSH, "w", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow(["REPO_ID"])
-        writer.writerows([[repo_id] for repo_id in forced_pr])
-
-    logging.info(f"Merged PR data written to {CSV_MERGED}.")
+    logging.info(f"Merged/forced PR data written to {CSV_MERGED}/{CSV_FORCED_PUSH}.")
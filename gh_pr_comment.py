@@ -17,25 +17,23 @@ __author__ = "Sebastian Sardina & Andrew Chester - ssardina - ssardina@gmail.com
 __copyright__ = "Copyright 2024"
 
 import csv
+import math
 import os
+import re
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List
 from datetime import datetime
-from zoneinfo import ZoneInfo  # this should work Python 3.9+
+from functools import partial
 from github import GithubException
 import importlib.util
 import sys
-import time
 
 import util
+from util import TIMEZONE
 import logging
 import coloredlogs
 
-# get the TIMEZONE to be used - works with Python < 3.9 via pytz and 3.9 via ZoneInfo
-TIMEZONE_STR = "Australia/Melbourne"
-TIMEZONE = ZoneInfo(TIMEZONE_STR)
-
-
 LOGGING_FMT = "%(asctime)s %(levelname)-8s %(message)s"
 LOGGING_DATE = "%a, %d %b %Y %H:%M:%S"
 LOGGING_LEVEL = logging.INFO
@@ -54,44 +52,322 @@ GH_URL_PREFIX = "https://github.com/"
 
 CSV_ERRORS = "pr_comment_errors.csv"
 
-SLEEP_TIME = 5  # sleep time in seconds between API calls
+REPORT_MAX_SIZE = 50000  # larger reports are not published (nor read)
+GH_COMMENT_MAX_SIZE = 65536  # GitHub rejects longer comments
+COMMENT_SEPARATOR = "\n\n---\n\n"  # between messages joined in one comment
+# cells read as missing (NaN) by pandas.read_csv, so "" in the marking dict
+CSV_NA_VALUES = frozenset(
+    [
+        "",
+        "#N/A",
+        "#N/A N/A",
+        "#NA",
+        "-1.#IND",
+        "-1.#QNAN",
+        "-NaN",
+        "-nan",
+        "1.#IND",
+        "1.#QNAN",
+        "<NA>",
+        "N/A",
+        "NA",
+        "NULL",
+        "NaN",
+        "None",
+        "n/a",
+        "nan",
+        "null",
+    ]
+)
+# cells read as booleans/numbers by pandas.read_csv (booleans in any case)
+CSV_BOOL_VALUES = {"true": True, "false": False}
+CSV_INT_RE = re.compile(r"[ \t]*[+-]?\d+[ \t]*", re.ASCII)
+CSV_FLOAT_RE = re.compile(
+    r"[ \t]*[+-]?(\d+\.?\d*|\.\d+)(e[+-]?\d+)?[ \t]*|[+-]?inf(inity)?",
+    re.ASCII | re.IGNORECASE,
+)
+
+# PR #1 (usually the Feedback one) and open PRs (latest first) of a repo
+GRAPHQL_PRS = """
+    pr1: issueOrPullRequest(number: 1) { ... on PullRequest { title } ... on Issue { title } }
+    pullRequests(first: 100, states: OPEN, orderBy: {field: CREATED_AT, direction: DESC}) {
+      nodes { number title }
+    }
+"""
+
+
+def column_type(values):
+    """
+    Type pandas.read_csv gives to a CSV column: bool if all values are TRUE/FALSE
+    (in any case), int if all are integers and none is missing, float if all the
+    non-missing ones are numbers, otherwise str
+
+    :param values: all the values (strings) of the column, with missing ones as ""
+    :return: bool, int, float or str
+    """
+    filled = [v for v in values if v != ""]
+    if filled and all(v.lower() in CSV_BOOL_VALUES for v in filled):
+        return bool
+    if all(CSV_INT_RE.fullmatch(v) for v in filled) and len(filled) == len(values):
+        return int
+    if all(CSV_FLOAT_RE.fullmatch(v) for v in filled):
+        return float
+    return str
+
 
+def round_2(x: float) -> float:
+    """Round to 2 decimals as numpy (and so DataFrame.round) does: x * 100 to even"""
+    y = x * 100
+    if math.isinf(y):
+        return y
+    return math.copysign(round(y) / 100, y)
 
-def load_marking_dict(file_path: str, col_key="GHU") -> dict:
+
+def load_marking_dict(file_path: str, col_key="GHU", keys=None) -> dict:
     """
     Load the marking dictionary from a CSV file; keys are GH username
+
+    Uses csv module (not pandas, too heavy to import just for this), but gives
+    the same values the pandas version did: column types (numbers, booleans) are
+    recognized using all the rows, missing values (NA, N/A, nan, ...) are "", and
+    float columns are rounded to 2 decimals if none of the loaded rows misses a
+    value (df.round(2) skipped the columns that replace(nan, "") made object).
+
+    :param file_path: the marking CSV file
+    :param col_key: column with the keys (GH username)
+    :param keys: if given, only the rows with these keys are loaded (column types
+        are still recognized using all the rows)
+    :return: dict key -> dict with the (converted) values of the row
     """
-    import pandas as pd
-    import numpy as np
-
-    # Old way to get a dictionary - does not regonise int type of columns
-    # comment_dict = {}
-    # with open(file_path, "r") as f:
-    #     reader = csv.DictReader(f)
-    #     for row in reader:
-    #         comment_dict[row["GHU"].lower()] = row
-
-    # Now we use Pandas as it recognizes column types (numbers)
-    df = pd.read_csv(file_path)
-    df.dropna(subset=[col_key], inplace=True)
-    df.drop_duplicates(subset=[col_key], keep="last", inplace=True)
-    df = df.replace(np.nan, "")
-    df.set_index(col_key, inplace=True)
-    df = df.round(2)
-    comment_dict = df.to_dict(orient="index")
-    for x in comment_dict:
-        comment_dict[x][col_key] = x
-
-    return comment_dict
-
-
-def issue_feedback_comment(pr, message, dry_run=False):
+    with open(file_path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        i_key = header.index(col_key)
+        rows = []
+        for row in reader:
+            # missing cells, including those of short rows, are "" (NaN in pandas)
+            row = ["" if v in CSV_NA_VALUES else v for v in row[: len(header)]]
+            row += [""] * (len(header) - len(row))
+            rows.append(row)
+
+    # types are recognized with all the rows, including those without a key
+    col_types = [column_type(values) for values in zip(*rows)]
+
+    # rows without a key are dropped; the last row of a key wins, if repeated
+    key_rows = {}
+    for row in rows:
+        if row[i_key]:
+            key_rows.pop(row[i_key], None)
+            key_rows[row[i_key]] = row
+
+    converters = []
+    for i, col_type in enumerate(col_types):
+        if i == i_key:  # the key itself is kept as read
+            converters.append(str)
+        elif col_type is bool:
+            converters.append(lambda v: CSV_BOOL_VALUES[v.lower()])
+        elif col_type is float and all(row[i] for row in key_rows.values()):
+            converters.append(lambda v: round_2(float(v)))
+        else:
+            converters.append(col_type)
+
+    return {
+        key: {
+            col: convert(v) if v != "" else ""
+            for col, convert, v in zip(header, converters, row)
+        }
+        for key, row in key_rows.items()
+        if keys is None or key in keys
+    }
+
+
+def issue_feedback_comment(post_comment, message, dry_run=False):
     if dry_run:
-        print("=" * 80)
-        print(message)
-        print("=" * 80)
+        # one print so messages of repos processed concurrently do not mix
+        print(f"{'=' * 80}\n{message}\n{'=' * 80}")
     else:
-        return pr.create_comment(message)
+        return post_comment(message)
+
+
+def issue_feedback_comments(post_comment, messages, dry_run=False):
+    """
+    Post messages to a PR joined in as few comments as possible (usually one),
+    instead of one comment (i.e., API call) per message
+
+    :param post_comment: function that posts a comment (body) to the PR
+    :param messages: list of messages (markdown), in order
+    :param dry_run: if True, do not post, just print the comments
+    """
+    comment = ""
+    for message in messages:
+        if comment and (
+            len(comment) + len(COMMENT_SEPARATOR) + len(message) > GH_COMMENT_MAX_SIZE
+        ):
+            issue_feedback_comment(post_comment, comment, dry_run)
+            comment = ""
+        comment = f"{comment}{COMMENT_SEPARATOR}{message}" if comment else message
+    if comment:
+        issue_feedback_comment(post_comment, comment, dry_run)
+
+
+def get_feedback_prs(token, repo_names):
+    """
+    Find the number of the Feedback PR of each repo, with one GraphQL request
+    per batch of repos instead of getting PR #1 (and maybe listing the PRs) of each repo
+
+    :param token: GitHub token to authenticate
+    :param repo_names: list of repo names (owner + name)
+    :return: dict repo name -> number of its Feedback PR (0 if it has none)
+    """
+    feedback_prs = {}
+    for k in range(0, len(repo_names), util.GH_GRAPHQL_BATCH_SIZE):
+        batch = repo_names[k : k + util.GH_GRAPHQL_BATCH_SIZE]
+        for repo_name, repo in zip(
+            batch, util.gh_graphql_repos(token, batch, GRAPHQL_PRS)
+        ):
+            if repo is None:
+                continue  # unknown, will be looked up when processing the repo
+            if (repo["pr1"] or {}).get("title") == "Feedback":
+                feedback_prs[repo_name] = 1
+            else:
+                feedback_prs[repo_name] = next(
+                    (
+                        pr["number"]
+                        for pr in repo["pullRequests"]["nodes"]
+                        if pr["title"] == "Feedback"
+                    ),
+                    0,
+                )
+    return feedback_prs
+
+
+def process_repo(g, r, marking_repo, config, args, k_label="", pr_no=None):
+    """
+    Push the feedback comments (autograder report and results) to the Feedback PR of a repo
+
+    :param g: handle to GitHub
+    :param r: the repo as read from the CSV file
+    :param marking_repo: the marking data of the repo (student)
+    :param config: the config module of the assessment (FEEDBACK_MESSAGE, report_feedback, check_submission)
+    :param args: the command line arguments
+    :param k_label: position of the repo in the list, for logging
+    :param pr_no: number of the Feedback PR, if known already (0 if known there is none)
+    :return: None if all went well, otherwise the error (message or exception)
+    """
+    repo_id = r["REPO_ID"].lower()
+    repo_name = r["REPO_NAME"]
+    # repo_url = f"https://github.com/{repo_name}"
+    repo_url = r["REPO_HTTP"]
+    logger.info(f"Processing repo {k_label}: {repo_id} - {repo_url}/pull/1")
+
+    try:
+        # only slow down when GitHub reports the rate limit is running out
+        util.pace_rate_limit(g, logger=logger)
+
+        # Find the Feedback PR - feedback
+        #   see we cannot use .get_pull(1) bc it involves reviewing the PRs!
+        if pr_no == 0:
+            logger.error(f"\t Feedback PR not found in {repo_name}! Skipping...")
+            return "Feedback PR not found"
+        if pr_no is not None:
+            if pr_no != 1:
+                logger.warning(
+                    f"\t Feedback PR found in number {pr_no}! Using this one: {repo_url}/pull/{pr_no}"
+                )
+            # PR known already: post to it directly, no need to get the repo and PR first
+            post_comment = partial(util.create_issue_comment, g, repo_name, pr_no)
+        else:
+            repo = g.get_repo(repo_name)
+            pr_feedback = repo.get_issue(number=1)
+            post_comment = pr_feedback.create_comment
+            if pr_feedback.title != "Feedback":
+                post_comment = None
+                for pr in repo.get_pulls():
+                    if pr.title == "Feedback":
+                        logger.warning(
+                            f"\t Feedback PR found in number {pr.number}! Using this one: {repo_url}/pull/{pr.number}"
+                        )
+                        # the PR can be commented as is, no need to get it again as issue
+                        post_comment = pr.create_issue_comment
+                        break
+                if post_comment is None:
+                    logger.error(
+                        f"\t Feedback PR not found in {repo_name}! Skipping..."
+                    )
+                    return "Feedback PR not found"
+
+        # print(marking_repo["Q3T"])
+        # print(type(marking_repo["Q3T"]))
+        # exit(0)
+
+        # First, check the submission row: should we skip it for any reason?
+        #   no certification, no submission, no marking, audit, etc..
+        #   all messages are posted together in one comment, so one API call per repo
+        messages = []
+        message, skip = config.check_submission(repo_id, marking_repo, logger)
+        if message is not None:
+            messages.append(message)
+        if skip:
+            issue_feedback_comments(post_comment, messages, args.dry_run)
+            return None
+
+        # Now there is a proper submission; issue the autograder report & feedback summary
+        # add the automarker report
+        if not args.no_report:
+            file_report = os.path.join(
+                args.REPORT_FOLDER, f"{repo_id}.{args.extension}"
+            )  # default report filename
+            file_report_error = os.path.join(
+                args.REPORT_FOLDER, f"{repo_id}_ERROR.{args.extension}"
+            )  # default report filename
+            if "REPORT" in marking_repo:
+                file_report = os.path.join(args.REPORT_FOLDER, marking_repo["REPORT"])
+
+            # if there is an error report, then use that one
+            error_text = None
+            if os.path.exists(file_report_error):
+                file_report = file_report_error
+                error_text = (
+                    "Your solution seems non-error free as requested in spec... 🥴"
+                )
+
+            # one stat to know both if the report exists and its size
+            try:
+                report_size = os.stat(file_report).st_size
+            except FileNotFoundError:
+                logger.error(
+                    f"\t Error in repo {repo_name}: report {file_report} (or _ERROR) not found."
+                )
+                issue_feedback_comments(post_comment, messages, args.dry_run)
+                return "Report not found"
+            if report_size > REPORT_MAX_SIZE:
+                logger.warning(
+                    f"\t Too large automarker report to publish for {repo_name}"
+                )
+                messages.append(f"Too large automarker report to publish... 🥴")
+            else:
+                # ok we have a good automarker report to publish now...
+                with open(file_report, "r") as report:
+                    report_text = report.read()
+
+                message = f"# Full autograder report \n\n ```{args.extension}\n{report_text}```"
+                if error_text is not None:
+                    message += f"\n**NOTE**: {error_text}"
+                message += f"\n{config.FEEDBACK_MESSAGE}"
+                messages.append(message)
+
+        # add the final marking/feedback table results
+        feedback_text = config.report_feedback(marking_repo)
+        message = f"Dear @{repo_id}: find here the FEEDBACK & RESULTS for the project. \n\n {feedback_text}"
+        messages.append(message)
+        issue_feedback_comments(post_comment, messages, args.dry_run)
+        return None
+    except GithubException as e:
+        logger.error(f"\t Error in repo {repo_name}: {e}")
+        return e
+    except Exception as e:
+        logger.error(f"\t Unknown error in repo {repo_name}: {e}")
+        return e
 
 
 if __name__ == "__main__":
@@ -105,6 +381,11 @@ if __name__ == "__main__":
     parser.add_argument(
         "--repos", nargs="+", help="if given, only the teams specified will be parsed."
     )
+    parser.add_argument(
+        "--token",
+        default=os.environ.get("GHTOKEN"),
+        help="GitHub authorization token. Defaults to GHTOKEN env variable.",
+    )
     parser.add_argument(
         "-t",
         "--token-file",
@@ -129,6 +410,12 @@ if __name__ == "__main__":
         default=False,
         help="Do not push the automarking report; just feedback result %(default)s.",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="number of repos processed concurrently (Default: %(default)s).",
+    )
     parser.add_argument(
         "--dry-run",
         action="store_true",
@@ -143,15 +430,24 @@ if __name__ == "__main__":
     # Now load the report feedback module for the specific assessment being used
     # Load the module from the given path
     # https://medium.com/@Doug-Creates/dynamically-import-a-module-by-full-path-in-python-bbdf4815153e
+    #   (the file loader already keeps its compiled bytecode in __pycache__/ for next runs)
     spec = importlib.util.spec_from_file_location("module_name", args.CONFIG)
     module_feedback = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module_feedback)
-    # Add the module to sys.modules
+    # Add the module to sys.modules before running it, as the normal import does
     sys.modules["module_name"] = module_feedback
+    spec.loader.exec_module(module_feedback)
 
-    FEEDBACK_MESSAGE = getattr(module_feedback, "FEEDBACK_MESSAGE")
-    report_feedback = getattr(module_feedback, "report_feedback")
-    check_submission = getattr(module_feedback, "check_submission")
+    # the config module is passed as is to process_repo, check it has all it needs
+    missing = [
+        x
+        for x in ("FEEDBACK_MESSAGE", "report_feedback", "check_submission")
+        if not hasattr(module_feedback, x)
+    ]
+    if missing:
+        logger.error(
+            f"Config file {args.CONFIG} does not define: {', '.join(missing)}."
+        )
+        exit(1)
 
     # Get the list of relevant repos from the CSV file
     list_repos = util.get_repos_from_csv(args.REPO_CSV, args.repos)
@@ -169,16 +465,20 @@ if __name__ == "__main__":
         logger.error(f'No repos found in the mapping file "{args.REPO_CSV}". Stopping.')
         exit(0)
 
-    marking_dict = load_marking_dict(args.MARKING_CSV)
+    # only the rows of the repos to process are needed
+    marking_dict = load_marking_dict(
+        args.MARKING_CSV, keys={r["REPO_ID"].lower() for r in list_repos}
+    )
 
     ###############################################
     # Authenticate to GitHub
     ###############################################
-    if not args.token_file:
-        logger.error("No token file for authentication provided, quitting....")
+    if not args.token_file and not args.token:
+        logger.error("No token or token file for authentication provided, quitting....")
         exit(1)
     try:
-        g = util.open_gitHub(token_file=args.token_file)
+        g = util.open_gitHub(token=args.token, token_file=args.token_file)
+        util.log_rate_limit(g, logger)
     except:
         logger.error(
             "Something wrong happened during GitHub authentication. Check credentials."
@@ -188,122 +488,58 @@ if __name__ == "__main__":
     ###############################################
     # Process each repo in list_repos
     ###############################################
-    authors_stats = []
+    # look up all the Feedback PRs beforehand, in a few requests
+    token = util.read_token(token_file=args.token_file, token=args.token)
+    try:
+        feedback_prs = get_feedback_prs(token, [r["REPO_NAME"] for r in list_repos])
+    except GithubException as e:
+        logger.warning(f"Could not look up the Feedback PRs beforehand: {e}")
+        feedback_prs = {}
+
     no_repos = len(list_repos)
     errors = []
-    for k, r in enumerate(list_repos):
-        if k % 10 == 0 and k > 0:
-            logger.info(f"Sleep for {SLEEP_TIME} seconds...")
-            time.sleep(SLEEP_TIME)
-
-        repo_id = r["REPO_ID"].lower()
-        repo_name = r["REPO_NAME"]
-        # repo_url = f"https://github.com/{repo_name}"
-        repo_url = r["REPO_HTTP"]
-        logger.info(
-            f"Processing repo {k+start_no}/{end_no}: {repo_id} - {repo_url}/pull/1"
-        )
-        if repo_id not in marking_dict:
-            logger.error(f"\t Repo {repo_name} not found in {args.MARKING_CSV}.")
-            errors.append([repo_id, repo_url, "Repo not found in marking CSV"])
-            continue
-
-        repo = g.get_repo(repo_name)
-        try:
-            # Find the Feedback PR - feedback
-            #   see we cannot use .get_pull(1) bc it involves reviewing the PRs!
-            pr_feedback = repo.get_issue(number=1)
-            if pr_feedback.title != "Feedback":
-                pr_feedback = None
-                for pr in repo.get_pulls():
-                    if pr.title == "Feedback":
-                        logger.warning(
-                            f"\t Feedback PR found in number {pr.number}! Using this one: {repo_url}/pull/{pr.number}"
-                        )
-                        pr_feedback = repo.get_issue(number=pr.number)
-                        break
-                if pr_feedback is None:
-                    logger.error("\t Feedback PR not found! Skipping...")
-                    errors.append([repo_id, repo_url, "Feedback PR not found"])
-                    continue
-
-            # get the marking data for the student/repo
-            marking_repo = marking_dict[repo_id]
-
-            # print(marking_repo["Q3T"])
-            # print(type(marking_repo["Q3T"]))
-            # exit(0)
-
-            # First, check the submission row: should we skip it for any reason?
-            #   no certification, no submission, no marking, audit, etc..
-            message, skip = check_submission(repo_id, marking_repo, logger)
-            if message is not None:
-                issue_feedback_comment(pr_feedback, message, args.dry_run)
-            if skip:
-                continue
-
-            # Now there is a proper submission; issue the autograder report & feedback summary
-            # create a new comment with the automarker report
-            if not args.no_report:
-                file_report = os.path.join(
-                    args.REPORT_FOLDER, f"{repo_id}.{args.extension}"
-                )  # default report filename
-                file_report_error = os.path.join(
-                    args.REPORT_FOLDER, f"{repo_id}_ERROR.{args.extension}"
-                )  # default report filename
-                if "REPORT" in marking_repo:
-                    file_report = os.path.join(
-                        args.REPORT_FOLDER, marking_repo["REPORT"]
-                    )
-
-                # if there is an error report, then use that one
-                error_text = None
-                if os.path.exists(file_report_error):
-                    file_report = file_report_error
-                    error_text = (
-                        "Your solution seems non-error free as requested in spec... 🥴"
-                    )
+    # errors are written as they happen (line buffered), so a crash or Ctrl-C keeps them
+    #   (errors of the previous run are kept in a backup)
+    util.backup_file(CSV_ERRORS, logger)
+    with open(CSV_ERRORS, "w", newline="", buffering=1) as file_errors:
+        writer = csv.writer(file_errors)
+        writer.writerow(["REPO_ID", "REPO_URL", "ERROR"])
 
-                if not os.path.exists(file_report):
-                    logger.error(
-                        f"\t Error in repo {repo_name}: report {file_report} (or _ERROR) not found."
+        # repos are independent: process them concurrently, as it is all waiting on GitHub
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            futures = {}
+            for k, r in enumerate(list_repos):
+                repo_id = r["REPO_ID"].lower()
+                if repo_id not in marking_dict:
+                    logger.error(f"\t Repo {repo_id} not found in {args.MARKING_CSV}.")
+                    errors.append(
+                        [repo_id, r["REPO_HTTP"], "Repo not found in marking CSV"]
                     )
-                    errors.append([repo_id, repo_url, "Report not found"])
+                    writer.writerow(errors[-1])
                     continue
-                if os.stat(file_report).st_size > 50000:
-                    logger.warning(f"\t Too large automarker report to publish")
-                    issue_feedback_comment(
-                        pr_feedback,
-                        f"Too large automarker report to publish... 🥴",
-                        args.dry_run,
-                    )
-                else:
-                    # ok we have a good automarker report to publish now...
-                    with open(os.path.join(file_report), "r") as report:
-                        report_text = report.read()
-
-                    message = f"# Full autograder report \n\n ```{args.extension}\n{report_text}```"
-                    if error_text is not None:
-                        message += f"\n**NOTE**: {error_text}"
-                    message += f"\n{FEEDBACK_MESSAGE}"
-                    issue_feedback_comment(pr_feedback, message, args.dry_run)
-
-            # create a new comment with the final marking/feedback table results
-            feedback_text = report_feedback(marking_repo)
-            message = f"Dear @{repo_id}: find here the FEEDBACK & RESULTS for the project. \n\n {feedback_text}"
-            issue_feedback_comment(pr_feedback, message, args.dry_run)
-        except GithubException as e:
-            logger.error(f"\t Error in repo {repo_name}: {e}")
-            errors.append([repo_id, repo_url, e])
-        except Exception as e:
-            logger.error(f"\t Unknown error in repo {repo_name}: {e}")
-            errors.append([repo_id, repo_url, e])
+                future = executor.submit(
+                    process_repo,
+                    g,
+                    r,
+                    marking_dict[repo_id],
+                    module_feedback,
+                    args,
+                    f"{k+start_no}/{end_no}",
+                    feedback_prs.get(r["REPO_NAME"]),
+                )
+                futures[future] = r
+
+            # errors are collected here, in the main thread, so no locking is needed
+            for future in as_completed(futures):
+                r = futures[future]
+                try:
+                    error = future.result()
+                except Exception as e:  # process_repo catches its errors; just in case
+                    logger.error(f"\t Unknown error in repo {r['REPO_NAME']}: {e}")
+                    error = e
+                if error is not None:
+                    errors.append([r["REPO_ID"].lower(), r["REPO_HTTP"], error])
+                    writer.writerow(errors[-1])
 
     logger.info(f"Finished! Total repos: {no_repos} - Errors: {len(errors)}.")
-
-    with open(CSV_ERRORS, "a", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow(["REPO_ID", "REPO_URL", "ERROR"])
-        writer.writerows(errors)
-
     logger.info(f"Repos with errors written to {CSV_ERRORS}.")
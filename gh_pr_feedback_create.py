@@ -13,8 +13,10 @@ __author__ = "Sebastian Sardina - ssardina - ssardina@gmail.com"
 __copyright__ = "Copyright 2024"
 
 import csv
+import os
 
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import util
 from typing import List
 
@@ -25,11 +27,7 @@ import logging
 import coloredlogs
 
 from datetime import datetime
-from zoneinfo import ZoneInfo  # this should work Python 3.9+
-
-TIMEZONE_STR = "Australia/Melbourne"
-TIMEZONE = ZoneInfo(TIMEZONE_STR)
-
+from util import TIMEZONE
 
 LOGGING_FMT = "%(asctime)s %(levelname)-8s %(message)s"
 LOGGING_DATE = "%a, %d %b %Y %H:%M:%S"
@@ -65,6 +63,103 @@ MESSAGE_PR = """
 Subscribed: @{GH_USERNAME}
 """
 
+
+def process_repo(g: Github, r, k, no_repos, base_sha, dry_run=False):
+    """
+    Check the Feedback PR #1 of a repo and create it (and its feedback branch) if missing
+
+    :param g: handle to GitHub
+    :param r: the repo as read from the CSV file
+    :param k: index of the repo, for logging
+    :param no_repos: total number of repos, for logging
+    :param base_sha: SHA of the first commit in main, to create the feedback branch from
+    :param dry_run: if True, do not create anything
+    :return: tuple (error, missing, stop): the rows for the error and missing PR CSV files
+        (None if none) and whether to stop processing repos (failure creating a PR)
+    """
+    repo_id = r["REPO_ID"]
+    repo_name = r["REPO_NAME"]
+    repo_url = f"https://github.com/{repo_name}"
+    logging.info(f"Processing repo {k}/{no_repos}: {repo_id} ({repo_url})...")
+
+    # g is lazy: no request to get the repo itself, only its commits and PR are needed
+    repo = g.get_repo(repo_name)
+
+    # first check that no force-pushed has over-written main branch
+    #   (first real request, fails if the repo or its main branch does not exist)
+    try:
+        commits = repo.get_commits("main")
+        first_commit_main = commits[commits.totalCount - 1]
+    except GithubException as e:
+        logging.error(f"\t {repo_id}: Error getting commits of main: {e}")
+        return [repo_id, repo_url, "get-commits", e], None, False
+    if first_commit_main.sha != base_sha:
+        logging.error(
+            f"\t {repo_id}: First commit is different from expected, forced pushed?"
+        )
+        return [repo_id, repo_url, "forced", first_commit_main.sha], None, False
+
+    # OK first commit in main exists, let's check if the PR exists and create it if not
+    try:
+        pr_feedback = repo.get_pull(number=1)  # get the first PR - feedback
+
+        if pr_feedback.title != "Feedback":
+            logging.error(f"\t {repo_id}: PR with different title {pr_feedback.title}")
+            return [repo_id, repo_url, "title", pr_feedback.title], None, False
+
+        if pr_feedback.merged:
+            logging.info(f"\t {repo_id}: PR Feedback merged!!! {pr_feedback}")
+            return [repo_id, repo_url, "merged", ""], None, False
+        return None, None, False
+    except GithubException as e:
+        if e.status == 404:
+            logging.error(
+                f"\t No Feedback PR #1 found in repo {repo_name}. We will create it..."
+            )
+        else:
+            logging.error(f"\t {repo_id}: Unknown getting PR Feedback: {e}")
+            return [repo_id, repo_url, "get-PR", e], None, False
+
+    # we know PR is missing, so we will create it
+    if dry_run:
+        # logging.info(
+        #     f"\t Dry run!!!: Would create feedback branch at SHA {base_sha} and Feedback PR with body: \n \t {MESSAGE_PR.format(GH_USERNAME=repo_id)}."
+        # )
+        logging.info(
+            f"\t {repo_id}: Dry run!!!: Would create feedback branch at SHA {base_sha} and Feedback PR."
+        )
+        return None, [repo_id, repo_url, "dry-run", ""], False
+
+    # first, create a feedback branch from the base SHA
+    try:
+        repo.create_git_ref("refs/heads/feedback", base_sha)
+    except GithubException as e:
+        if e.data["message"] == "Reference already exists":
+            logging.info(f"\t {repo_id}: Branch feedback already exists.")
+        else:
+            logging.error(f"\t {repo_id}: Error creating branch feedback: {e}")
+            return [repo_id, repo_url, "create-branch", e], None, False
+
+    # second, create a PR for feedback branch
+    try:
+        repo.create_pull(
+            title="Feedback",
+            body=MESSAGE_PR.format(GH_USERNAME=repo_id),
+            head="main",
+            base="feedback",
+        )
+    except GithubException as e:
+        logging.error(f"\t Exception when creating PR in repo {repo_name}: {e}")
+        missing = [repo_id, repo_url, "pr-create", e]
+        if e.data["message"] == "Validation Failed":
+            logging.error(f"\t {repo_id}: Perhaps no commits exist in repo.")
+            return [repo_id, repo_url, "validation-pr", e], missing, False
+        return [repo_id, repo_url, "create-pr", e], missing, True
+
+    # all good!
+    return None, [repo_id, repo_url, "created", ""], False
+
+
 if __name__ == "__main__":
     parser = ArgumentParser(description="Merge PRs in multiple repos")
     parser.add_argument("REPO_CSV", help="List of repositories to get data from.")
@@ -72,6 +167,11 @@ if __name__ == "__main__":
     parser.add_argument(
         "--repos", nargs="+", help="if given, only the teams specified will be parsed."
     )
+    parser.add_argument(
+        "--token",
+        default=os.environ.get("GHTOKEN"),
+        help="GitHub authorization token. Defaults to GHTOKEN env variable.",
+    )
     parser.add_argument(
         "-t",
         "--token-file",
@@ -89,6 +189,12 @@ if __name__ == "__main__":
         default=False,
         help="Dump results into CSV files (Default: %(default)s.)",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="number of repos processed concurrently (Default: %(default)s).",
+    )
 
     args = parser.parse_args()
 
@@ -107,11 +213,14 @@ if __name__ == "__main__":
     ###############################################
     # Authenticate to GitHub
     ###############################################
-    if not args.token_file and not (args.user or args.password):
-        logging.error("No authentication provided, quitting....")
+    if not args.token_file and not args.token:
+        logging.error(
+            "No token or token file for authentication provided, quitting...."
+        )
         exit(1)
     try:
-        g = util.open_gitHub(token_file=args.token_file)
+        g = util.open_gitHub(token=args.token, token_file=args.token_file, lazy=True)
+        util.log_rate_limit(g)
     except:
         logging.error(
             "Something wrong happened during GitHub authentication. Check credentials."
@@ -121,92 +230,38 @@ if __name__ == "__main__":
     ###############################################
     # Process each repo in list_repos
     ###############################################
-    authors_stats = []
     no_repos = len(list_repos)
     missing_pr = []
     errors = []
-    for k, r in enumerate(list_repos):
-        repo_id = r["REPO_ID"]
-        repo_name = r["REPO_NAME"]
-        repo_url = f"https://github.com/{repo_name}"
-        logging.info(f"Processing repo {k}/{no_repos}: {repo_id} ({repo_url})...")
-
-        repo = g.get_repo(repo_name)
-
-        # first check that no force-pushed has over-written main branch
-        commits = repo.get_commits("main")
-        first_commit_main = commits[commits.totalCount - 1]
-        if first_commit_main.sha != args.BASE_SHA:
-            logging.error(f"\t First commit is different from expected, forced pushed?")
-            errors.append([repo_id, repo_url, "forced", first_commit_main.sha])
-            continue
-
-        # OK first commit in main exists, let's check if the PR exists and create it if not
-        try:
-            pr_feedback = repo.get_pull(number=1)  # get the first PR - feedback
-
-            if pr_feedback.title != "Feedback":
-                logging.error(f"\t PR with different title {pr_feedback.title}")
-                errors.append([repo_id, repo_url, "title", pr_feedback.title])
-                continue
-
-            if pr_feedback.merged:
-                logging.info(f"\t PR Feedback merged!!! {pr_feedback}")
-                errors.append([repo_id, repo_url, "merged", ""])
+    # repos are independent: process them concurrently, as it is all waiting on GitHub
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(
+                process_repo, g, r, k, no_repos, args.BASE_SHA, args.dry_run
+            ): r
+            for k, r in enumerate(list_repos)
+        }
+        # results are collected here, in the main thread, so no locking is needed
+        for future in as_completed(futures):
+            if future.cancelled():
                 continue
-        except GithubException as e:
-            if e.status == 404:
-                logging.error(
-                    f"\t No Feedback PR #1 found in repo {repo_name}. We will create it..."
-                )
-            else:
-                logging.error(f"\t Unknown getting PR Feedback: {e}")
-                errors.append([repo_id, repo_url, "get-PR", e])
-                continue
-
-            # we know PR is missing, so we will create it
-            if args.dry_run:
-                # logging.info(
-                #     f"\t Dry run!!!: Would create feedback branch at SHA {args.BASE_SHA} and Feedback PR with body: \n \t {MESSAGE_PR.format(GH_USERNAME=repo_id)}."
-                # )
-                logging.info(
-                    f"\t Dry run!!!: Would create feedback branch at SHA {args.BASE_SHA} and Feedback PR."
-                )
-                missing_pr.append([repo_id, repo_url, "dry-run", ""])
-                continue
-
-            # first, create a feedback branch from the base SHA
             try:
-                repo.create_git_ref("refs/heads/feedback", args.BASE_SHA)
-            except GithubException as e:
-                if e.data["message"] == "Reference already exists":
-                    logging.info(f"\t Branch feedback already exists.")
-                else:
-                    logging.error(f"\t Error creating branch feedback: {e}")
-                    errors.append([repo_id, repo_url, "create-branch", e])
-                    continue
-
-            # second, create a PR for feedback branch
-            try:
-                repo.create_pull(
-                    title="Feedback",
-                    body=MESSAGE_PR.format(GH_USERNAME=repo_id),
-                    head="main",
-                    base="feedback",
-                )
-            except GithubException as e:
-                logging.error(f"\t Exception when creating PR in repo {repo_name}: {e}")
-                missing_pr.append([repo_id, repo_url, "pr-create", e])
-                if e.data["message"] == "Validation Failed":
-                    logging.error(f"\t Perhaps no commits exist in repo.")
-                    errors.append([repo_id, repo_url, "validation-pr", e])
-                else:
-                    errors.append([repo_id, repo_url, "create-pr", e])
-                    break
+                error, missing, stop = future.result()
+            except Exception as e:
+                # do not lose the results of the other repos for one unexpected error
+                r = futures[future]
+                repo_url = f"https://github.com/{r['REPO_NAME']}"
+                logging.error(f"\t {r['REPO_ID']}: Unknown error processing repo: {e}")
+                errors.append([r["REPO_ID"], repo_url, "unknown", e])
                 continue
-
-                # all good!
-            missing_pr.append([repo_id, repo_url, "created", ""])
+            if error is not None:
+                errors.append(error)
+            if missing is not None:
+                missing_pr.append(missing)
+            if stop:
+                # do not start the repos still waiting (the ones running will finish)
+                for f in futures:
+                    f.cancel()
 
     # print summary stats
     no_merged = len([x for x in errors if x[2] == "merged"])
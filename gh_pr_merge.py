@@ -16,7 +16,10 @@ Some usage help on PyGithub:
 __author__ = "Sebastian Sardina - ssardina - ssardina@gmail.com"
 __copyright__ = "Copyright 2019-2023"
 
+import os
+
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import util
 from typing import List
 
@@ -27,11 +30,7 @@ import logging
 import coloredlogs
 
 from datetime import datetime
-from zoneinfo import ZoneInfo  # this should work Python 3.9+
-
-TIMEZONE_STR = "Australia/Melbourne"
-TIMEZONE = ZoneInfo(TIMEZONE_STR)
-
+from util import TIMEZONE
 
 LOGGING_FMT = "%(asctime)s %(levelname)-8s %(message)s"
 LOGGING_DATE = "%a, %d %b %Y %H:%M:%S"
@@ -44,6 +43,105 @@ CSV_HEADER = ["REPO_ID", "AUTHOR", "COMMITS", "ADDITIONS", "DELETIONS"]
 
 GH_URL_PREFIX = "https://github.com/"
 
+SEARCH_MAX_RESULTS = 1000  # GitHub search never returns more results than this
+
+
+def find_prs_by_title(g: Github, owners, title):
+    """
+    Find the open PRs with a text in their title across all repos of some organizations
+
+    A few search requests (100 PRs each) replace listing the PRs of every repo.
+
+    :param g: handle to GitHub
+    :param owners: organizations owning the repos
+    :param title: text in the title of the PRs
+    :return: dict repo name (owner + name, lowercase) -> number of its latest PR with title,
+        or None if there are too many PRs to get them all via search
+    """
+    prs = {}
+    # a " would end the quoted text in the query; search ignores punctuation anyway
+    title_query = title.replace('"', " ")
+    for owner in owners:
+        results = g.search_issues(
+            f'org:{owner} is:pr is:open in:title "{title_query}"',
+            sort="created",
+            order="desc",
+        )
+        if results.totalCount >= SEARCH_MAX_RESULTS:
+            return None
+        for issue in results:
+            if title not in issue.title:  # search matches words, not substrings
+                continue
+            # html_url is https://github.com/<owner>/<name>/pull/<no>
+            repo_name = "/".join(issue.html_url.split("/")[3:5]).lower()
+            prs.setdefault(repo_name, issue.number)
+    return prs
+
+
+def merge_pr(g: Github, r, k, no_repos, no=None, title=None, prs_title=None):
+    """
+    Merge the relevant PR of a repo, if it is not merged already
+
+    :param g: handle to GitHub
+    :param r: the repo as read from the CSV file
+    :param k: index of the repo, for logging
+    :param no_repos: total number of repos, for logging
+    :param no: number of the PR to merge
+    :param title: text in the title of the PR to merge (used if no number given)
+    :param prs_title: PRs with title found via search (see find_prs_by_title), if any;
+        the PRs of repos not found there are still checked one by one
+    :return: True if merged, False if merging failed, None if nothing to merge
+    """
+    repo_id = r["REPO_ID"]
+    repo_name = r["REPO_NAME"]
+    repo_url = f"https://github.com/{repo_name}"
+    logging.info(f"Processing repo {k}/{no_repos}: {repo_id} ({repo_url})...")
+
+    try:
+        repo = g.get_repo(repo_name)
+
+        pr_sync = None
+        if no is not None:
+            prs = repo.get_pulls()
+            if prs.totalCount < no:
+                logging.warning(
+                    f"\t {repo_id}: No PR with number {no} - Repo has only {prs.totalCount} PRs."
+                )
+                return None
+            else:
+                pr_sync = repo.get_pull(no)
+        elif prs_title is not None and repo_name.lower() in prs_title:
+            pr_sync = repo.get_pull(prs_title[repo_name.lower()])
+        else:
+            # not found by search: it matches whole words only (title may be part of
+            # a word) and may not have indexed new PRs yet, so check the repo PRs
+            for pr in repo.get_pulls():
+                if title in pr.title:
+                    pr_sync = pr
+                    break
+            if pr_sync is None:
+                logging.warning(f"\t {repo_id}: No PR containing '{title}' in title.")
+                return None
+
+        logging.info(f"\t {repo_id}: Found relevant PR: {pr_sync}")
+
+        if pr_sync.merged:
+            logging.info(f"\t {repo_id}: PR already merged.")
+            return None
+
+        logging.info(
+            f"\t {repo_id}: PR is still not merged - will try to merge it: {pr_sync}"
+        )
+        status = pr_sync.merge(merge_method="merge")
+        if status.merged:
+            logging.info(f"\t {repo_id}: Successful merging...")
+            return True
+        logging.error(f"\t {repo_id}: MERGING DIDN'T WORK - STATUS: {status}")
+        return False
+    except GithubException as e:
+        logging.error(f"\t {repo_id}: MERGING FAILED WITH EXCEPTION: {e}")
+        return False
+
 
 if __name__ == "__main__":
     parser = ArgumentParser(description="Merge PRs in multiple repos")
@@ -54,6 +152,17 @@ if __name__ == "__main__":
     parser.add_argument("--start", type=int, help="repo no to start processing from.")
     parser.add_argument("--no", type=int, help="number of the PR to merge.")
     parser.add_argument("--title", help="title of PR to merge.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of repos merged concurrently (Default: %(default)s, one at a time).",
+    )
+    parser.add_argument(
+        "--token",
+        default=os.environ.get("GHTOKEN"),
+        help="GitHub authorization token. Defaults to GHTOKEN env variable.",
+    )
     parser.add_argument(
         "-t",
         "--token-file",
@@ -80,11 +189,14 @@ if __name__ == "__main__":
     ###############################################
     # Authenticate to GitHub
     ###############################################
-    if not args.token_file and not (args.user or args.password):
-        logging.error("No authentication provided, quitting....")
+    if not args.token_file and not args.token:
+        logging.error(
+            "No token or token file for authentication provided, quitting...."
+        )
         exit(1)
     try:
-        g = util.open_gitHub(token_file=args.token_file)
+        g = util.open_gitHub(token=args.token, token_file=args.token_file)
+        util.log_rate_limit(g)
     except:
         logging.error(
             "Something wrong happened during GitHub authentication. Check credentials."
@@ -94,57 +206,35 @@ if __name__ == "__main__":
     ###############################################
     # Process each repo in list_repos
     ###############################################
-    authors_stats = []
+    # get PRs by title for all repos at once, instead of going through the PRs of each repo
+    prs_title = None
+    if args.no is None:
+        owners = {r["REPO_NAME"].split("/")[0] for r in list_repos}
+        try:
+            prs_title = find_prs_by_title(g, owners, args.title)
+        except GithubException as e:
+            logging.warning(f"Search of PRs by title failed: {e}")
+        if prs_title is None:
+            logging.warning(
+                "Too many PRs to search; will go through the PRs of each repo."
+            )
+
     no_repos = len(list_repos)
     no_merged = 0
     no_errors = 0
-    for k, r in enumerate(list_repos):
-        if args.start is not None and k < args.start:
-            continue
-        repo_id = r["REPO_ID"]
-        repo_name = r["REPO_NAME"]
-        repo_url = f"https://github.com/{repo_name}"
-        logging.info(f"Processing repo {k}/{no_repos}: {repo_id} ({repo_url})...")
-
-        repo = g.get_repo(repo_name)
-        prs = repo.get_pulls()
-
-        pr_sync = None
-        if args.no is not None:
-            if prs.totalCount < args.no:
-                logging.warning(
-                    f"\t No PR with number {args.no} - Repo has only {prs.totalCount} PRs."
-                )
-                continue
-            else:
-                pr_sync = repo.get_pull(args.no)
-        else:
-            for pr in prs:
-                if args.title in pr.title:
-                    pr_sync = pr
-                    break
-            if pr_sync is None:
-                logging.warning(f"\t No PR containing '{args.title}' in title.")
-                continue
-
-        logging.info(f"\t Found relevant PR: {pr_sync}")
-
-        if pr_sync.merged:
-            logging.info("\t PR already merged.")
-            continue
-
-        logging.info(f"\t PR is still not merged - will try to merge it: {pr_sync}")
-        try:
-            status = pr_sync.merge(merge_method="merge")
-            if status.merged:
-                logging.info(f"\t Successful merging...")
+    # repos are independent: merge them concurrently, as it is all waiting on GitHub
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(merge_pr, g, r, k, no_repos, args.no, args.title, prs_title)
+            for k, r in enumerate(list_repos)
+            if args.start is None or k >= args.start
+        ]
+        for future in as_completed(futures):
+            merged = future.result()
+            if merged:
                 no_merged += 1
-            else:
-                logging.error(f"\t MERGING DIDN'T WORK - STATUS: {status}")
+            elif merged is not None:
                 no_errors += 1
-        except GithubException as e:
-            logging.error(f"\t MERGING FAILED WITH EXCEPTION: {e}")
-            no_errors += 1
 
     logging.info(
         f"Finished! Total repos: {no_repos} - Merged successfully: {no_merged} - Failed to merge: {no_errors}."
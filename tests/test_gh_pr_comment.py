@@ -0,0 +1,123 @@
+"""
+Tests of gh_pr_comment.py: loading of the marking CSV
+
+Run from the root of the repo with: python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("github")
+pytest.importorskip("coloredlogs")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import gh_pr_comment
+
+MARKING_CSV = os.path.join(os.path.dirname(__file__), "fixtures", "marking.csv")
+
+# what the pandas version of load_marking_dict gave for MARKING_CSV
+MARKING_DICT = {
+    "alice": {
+        "GHU": "alice",
+        "Q1T": 2,
+        "RPOINTS": 21.333,
+        "WEIGHT": 0.67,
+        "SKIP": False,
+        "CERTIFICATION": "YES",
+        "MARKS": 85.25,
+        "NOTE-FEEDBACK": "updated",
+        "NOTE-OTHER": "",
+        "Q1": 3.0,
+        "TOTAL": "85.333",
+        "PENALTY": 0.12,
+    },
+    "bob": {
+        "GHU": "bob",
+        "Q1T": 5,
+        "RPOINTS": "",
+        "WEIGHT": 1.0,
+        "SKIP": True,
+        "CERTIFICATION": "",
+        "MARKS": "",
+        "NOTE-FEEDBACK": "",
+        "NOTE-OTHER": "",
+        "Q1": 2.0,
+        "TOTAL": "70",
+        "PENALTY": 0.0,
+    },
+    "carol": {
+        "GHU": "carol",
+        "Q1T": 3,
+        "RPOINTS": 12.0,
+        "WEIGHT": 0.5,
+        "SKIP": "",
+        "CERTIFICATION": "yes",
+        "MARKS": "",
+        "NOTE-FEEDBACK": "",
+        "NOTE-OTHER": "x",
+        "Q1": 1.0,
+        "TOTAL": "60.5",
+        "PENALTY": 0.0,
+    },
+    "dave": {
+        "GHU": "dave",
+        "Q1T": 1,
+        "RPOINTS": 7.0,
+        "WEIGHT": 1.0,
+        "SKIP": True,
+        "CERTIFICATION": "No",
+        "MARKS": 70.0,
+        "NOTE-FEEDBACK": "",
+        "NOTE-OTHER": "",
+        "Q1": 4.0,
+        "TOTAL": "91",
+        "PENALTY": 1.0,
+    },
+}
+
+
+def types(marking_dict):
+    return {
+        k: {col: type(v) for col, v in row.items()} for k, row in marking_dict.items()
+    }
+
+
+def load_marking_dict_pandas(file_path, col_key="GHU"):
+    """The previous pandas-based implementation of load_marking_dict"""
+    import numpy as np
+    import pandas as pd
+
+    df = pd.read_csv(file_path)
+    df.dropna(subset=[col_key], inplace=True)
+    df.drop_duplicates(subset=[col_key], keep="last", inplace=True)
+    df = df.replace(np.nan, "")
+    df.set_index(col_key, inplace=True)
+    df = df.round(2)
+    comment_dict = df.to_dict(orient="index")
+    for x in comment_dict:
+        comment_dict[x][col_key] = x
+    return comment_dict
+
+
+def test_load_marking_dict():
+    marking_dict = gh_pr_comment.load_marking_dict(MARKING_CSV)
+    assert marking_dict == MARKING_DICT
+    assert types(marking_dict) == types(MARKING_DICT)
+    # a repeated key is placed where its last row is
+    assert list(marking_dict) == ["bob", "carol", "alice", "dave"]
+
+
+def test_load_marking_dict_keys():
+    marking_dict = gh_pr_comment.load_marking_dict(MARKING_CSV, keys={"bob", "eve"})
+    assert marking_dict == {"bob": MARKING_DICT["bob"]}
+
+
+def test_load_marking_dict_as_pandas():
+    pytest.importorskip("pandas")
+    marking_dict = gh_pr_comment.load_marking_dict(MARKING_CSV)
+    marking_dict_pandas = load_marking_dict_pandas(MARKING_CSV)
+    assert marking_dict == marking_dict_pandas
+    assert list(marking_dict) == list(marking_dict_pandas)
+    assert types(marking_dict) == types(marking_dict_pandas)
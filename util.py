@@ -1,20 +1,38 @@
+import base64
 import csv
+import logging
+import os
+import queue
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
 from github import Github, Repository, Organization, GithubException, Auth
 
 import git
 
 
 import datetime
-import pytz
+from zoneinfo import ZoneInfo  # this should work Python 3.9+
 
 DATE_FORMAT = "%-d/%-m/%Y %-H:%-M:%-S"  # RMIT Uni (Australia)
 DATE_FORMAT = "%d/%m/%Y %H:%M:%S"
-TIMEZONE = pytz.timezone("Australia/Melbourne")
+TIMEZONE_STR = "Australia/Melbourne"
+TIMEZONE = ZoneInfo(TIMEZONE_STR)
 
 
 CSV_REPO_GIT = "REPO_URL"
 CSV_REPO_ID = "REPO_ID"
 
+GH_GRAPHQL_URL = "https://api.github.com/graphql"
+GH_MAX_RETRIES = 5  # max times to retry a request that hit a rate limit
+GH_PACE_THRESHOLD = 100  # start spacing requests when fewer than these are left
+GH_PER_PAGE = 100  # items per page in GitHub listings (max allowed; default is 30)
+GH_GRAPHQL_BATCH_SIZE = 25  # repos asked in each batched GraphQL request
+GH_POOL_SIZE = 32  # connections kept open to GitHub, enough for concurrent workers
+
+_gh_session = None
+
 
 def get_repos_from_csv(csv_file, repos_ids=None):
     """
@@ -22,38 +40,317 @@ def get_repos_from_csv(csv_file, repos_ids=None):
     Case insensitive search for the repo ids.
 
     :param csv_file: file where csv data is with two fields TEAM and GIT
-    :param repos_ids: list of specific repo names or None
+    :param repos_ids: collection of specific repo ids or None
     :return: a list of dictionaries for each repo (name, url, etc)
             e.g., {'ORG_NAME': 'RMIT-COSC1127-1125-AI24', 'ASSIGNMENT': 'p0-warmup', 'REPO_ID': 'msardina', 'REPO_NAME': 'RMIT-COSC1127-1125-AI24/p0-warmup-msardina', 'REPO_URL': 'git@github.com:RMIT-COSC1127-1125-AI24/p0-warmup-msardina.git'}
     """
 
-    # Get the list of ALL teams with their GIT URL from the CSV file
+    # If specific team ids given, just keep those them only (set for O(1) lookups)
+    if repos_ids is not None:
+        repos_ids = frozenset(map(str.lower, repos_ids))
+
+    # Get the list of teams with their GIT URL from the CSV file
     with open(csv_file, "r") as f:
         teams_reader = csv.DictReader(f, delimiter=",")
-        repos = list(teams_reader)
-
-    # If specific team ids given, just keep those them only
-    if repos_ids is not None:
         repos = [
             t
-            for t in repos
-            if t[CSV_REPO_ID].lower() in list(map(str.lower, repos_ids))
+            for t in teams_reader
+            if repos_ids is None or t[CSV_REPO_ID].lower() in repos_ids
         ]
     return repos
 
 
-def open_gitHub(token_file=None, token=None, user=None, password=None):
-    # Authenticate to GitHub
-    if token:
-        auth = Auth.Token(token)
-        g = Github(auth=auth)
+def read_token(token_file=None, token=None):
+    """
+    Get the GitHub token, either given directly or stored in a file
+
+    :param token_file: file containing the token
+    :param token: the token itself (used if no token_file is given)
+    :return: the token string or None
+    """
     if token_file:
         with open(token_file) as fh:
             token = fh.read().strip()
-        g = Github(token)
-    elif user and password:
-        g = Github(user, password)
-    return g
+    return token
+
+
+class RateLimitedSession(requests.Session):
+    """
+    HTTP session for GitHub that paces requests using the rate limit headers
+    of the responses and retries requests rejected by a rate limit
+
+    When fewer than min_remaining requests are left, it waits
+    (reset time - now) / remaining before each request, so the budget left is
+    spread until the limit is reset instead of being blocked when it runs out.
+    """
+
+    def __init__(self, min_remaining=GH_PACE_THRESHOLD):
+        super().__init__()
+        self.mount("https://", HTTPAdapter(pool_maxsize=GH_POOL_SIZE))
+        self.min_remaining = min_remaining
+        self.remaining = None  # requests left, as per last response
+        self.reset_at = None  # epoch time when rate limit is reset
+
+    def request(self, method, url, *args, **kwargs):
+        for attempt in range(GH_MAX_RETRIES + 1):
+            self._pace()
+            resp = super().request(method, url, *args, **kwargs)
+            if "X-RateLimit-Remaining" in resp.headers:
+                self.remaining = int(resp.headers["X-RateLimit-Remaining"])
+                self.reset_at = int(resp.headers["X-RateLimit-Reset"])
+            if resp.status_code not in (403, 429):
+                break
+            wait = rate_limit_wait(resp, attempt)
+            if wait is None or attempt == GH_MAX_RETRIES:
+                break
+            logging.warning(f"GitHub rate limit hit, waiting {wait:.0f} seconds...")
+            time.sleep(wait)
+        return resp
+
+    def _pace(self):
+        if self.remaining is None or self.remaining >= self.min_remaining:
+            return
+        wait = (self.reset_at - time.time()) / max(self.remaining, 1)
+        if wait > 0:
+            time.sleep(wait)
+
+
+def gh_session():
+    """
+    Shared HTTP session to talk to GitHub, so the same connection (TCP + TLS)
+    is reused across requests instead of opening a new one each time
+
+    :return: the RateLimitedSession object
+    """
+    global _gh_session
+    if _gh_session is None:
+        _gh_session = RateLimitedSession()
+    return _gh_session
+
+
+def rate_limit_wait(resp, attempt=0):
+    """
+    Seconds to wait before retrying a failed request that hit a GitHub rate limit
+    See: https://docs.github.com/en/rest/using-the-rest-api/rate-limits-for-the-rest-api
+
+    :param resp: the (failed) response of the request
+    :param attempt: number of retries done so far, for exponential backoff
+    :return: seconds to wait, or None if the request did not hit a rate limit
+    """
+    if "Retry-After" in resp.headers:  # secondary rate limit
+        return int(resp.headers["Retry-After"])
+    if resp.headers.get("X-RateLimit-Remaining") == "0":  # primary rate limit
+        return max(int(resp.headers["X-RateLimit-Reset"]) - time.time(), 0) + 1
+    if resp.status_code == 429:  # secondary rate limit with no hint
+        return 60 * 2**attempt
+    return None
+
+
+def gh_graphql(token, query, variables=None, partial=False):
+    """
+    Run a query against the GitHub GraphQL API (https://docs.github.com/en/graphql)
+
+    :param token: GitHub token to authenticate
+    :param query: the GraphQL query
+    :param variables: dictionary with the variables of the query
+    :param partial: if True, return the data even if parts of the query failed (those are None)
+    :return: the "data" part of the answer
+    :raises GithubException: if the request failed or GraphQL reported errors
+    """
+    for attempt in range(GH_MAX_RETRIES + 1):
+        # the session already deals with HTTP 403/429 rate limit answers
+        resp = gh_session().post(
+            GH_GRAPHQL_URL,
+            json={"query": query, "variables": variables or {}},
+            headers={"Authorization": f"bearer {token}"},
+        )
+        if resp.status_code != 200:
+            raise GithubException(resp.status_code, resp.text, dict(resp.headers))
+        data = resp.json()
+        errors = data.get("errors")
+        if not errors:
+            return data["data"]
+
+        # GraphQL may report the rate limit as an error: wait and ask again
+        rate_limited = any(e.get("type") == "RATE_LIMITED" for e in errors)
+        if partial and not rate_limited and data.get("data") is not None:
+            return data["data"]
+        if attempt == GH_MAX_RETRIES or not rate_limited:
+            raise GithubException(resp.status_code, errors, dict(resp.headers))
+        wait = rate_limit_wait(resp, attempt) or 60 * 2**attempt
+        logging.warning(f"GitHub rate limit hit, waiting {wait:.0f} seconds...")
+        time.sleep(wait)
+
+
+def gh_graphql_repos(token, repo_names, fields):
+    """
+    Query the same fields of several repos with a single GitHub GraphQL request
+    (one aliased "repository" per repo), instead of one or more requests per repo
+
+    :param token: GitHub token to authenticate
+    :param repo_names: list of repo names (owner + name); keep it small (e.g., 25)
+    :param fields: GraphQL selection on a Repository, e.g., "pullRequest(number: 1) { merged }"
+    :return: list with the data of each repo (None if the repo could not be got)
+    """
+    variables = {}
+    params = []
+    aliases = []
+    for i, repo_name in enumerate(repo_names):
+        variables[f"owner{i}"], variables[f"name{i}"] = repo_name.split("/")
+        params.append(f"$owner{i}: String!, $name{i}: String!")
+        aliases.append(
+            f"repo{i}: repository(owner: $owner{i}, name: $name{i}) {{ {fields} }}"
+        )
+    query = f"query({', '.join(params)}) {{ {' '.join(aliases)} }}"
+
+    data = gh_graphql(token, query, variables, partial=True)
+    return [data.get(f"repo{i}") for i in range(len(repo_names))]
+
+
+def iter_prefetch(iterable, maxsize=1000):
+    """
+    Iterate over an iterable in a background thread (producer), so its work
+    (e.g., fetching pages from GitHub) overlaps with the processing of the
+    items done by the caller (consumer)
+
+    Exceptions raised by the iterable are re-raised to the caller.
+
+    :param iterable: the iterable to consume, e.g., a generator fetching pages from GitHub
+    :param maxsize: max number of items fetched ahead of the caller
+    :return: generator of the items of iterable, in the same order
+    """
+    q = queue.Queue(maxsize=maxsize)
+    done = object()  # sentinel to signal end of iterable
+
+    def produce():
+        try:
+            for item in iterable:
+                q.put((item, None))
+            q.put((done, None))
+        except Exception as e:
+            q.put((done, e))
+
+    # daemon thread so it does not block exiting if the caller stops early
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item, error = q.get()
+        if item is done:
+            if error is not None:
+                raise error
+            return
+        yield item
+
+
+def open_gitHub(token_file=None, token=None, lazy=False):
+    """
+    Authenticate to GitHub with a token (user/password login is deprecated by GitHub)
+
+    :param token_file: file containing the token
+    :param token: the token itself (used if no token_file is given)
+    :param lazy: if True, objects (e.g., repos) are not fetched until an attribute not known is used
+    :return: the github.Github object
+    """
+    token = read_token(token_file=token_file, token=token)
+    if not token:
+        raise ValueError("No GitHub token provided")
+    # a bigger connection pool so concurrent workers reuse connections
+    return Github(
+        auth=Auth.Token(token), per_page=GH_PER_PAGE, pool_size=GH_POOL_SIZE, lazy=lazy
+    )
+
+
+def log_rate_limit(g: Github, logger=logging):
+    """
+    Log how many GitHub API requests are left in the current rate limit window
+
+    :param g: handle to GitHub
+    :param logger: the logger to use
+    """
+    remaining, limit = g.rate_limiting
+    logger.info(f"GitHub API rate limit: {remaining}/{limit} requests remaining.")
+
+
+def print_repo_info(repo, contents=False):
+    """
+    Print information of a PyGithub repository object
+
+    Note getting the repository object and its contents/license costs extra
+    API calls per repo, so only use it for debugging (option --verbose).
+
+    :param repo: the github.Repository.Repository object
+    :param contents: if True, also print the files and license of the repo (two extra API calls)
+    """
+    # repository full name
+    print("Full name:", repo.full_name)
+    # repository description
+    print("Description:", repo.description)
+    # the date of when the repo was created
+    print("Date created:", repo.created_at)
+    # the date of the last git push
+    print("Date of last push:", repo.pushed_at)
+    # home website (if available)
+    print("Home Page:", repo.homepage)
+    # programming language
+    print("Language:", repo.language)
+    # number of forks
+    print("Number of forks:", repo.forks)
+    # number of stars
+    print("Number of stars:", repo.stargazers_count)
+    print("-" * 50)
+    if not contents:
+        return
+    # repository content (files & directories)
+    print("Contents:")
+    for content in repo.get_contents(""):
+        print(content)
+    try:
+        # repo license
+        print(
+            "License:", base64.b64decode(repo.get_license().content.encode()).decode()
+        )
+    except:
+        pass
+
+
+def create_issue_comment(g: Github, repo_name, number, body):
+    """
+    Post a comment to an issue (or PR) of a repo with a single request, instead
+    of getting the repo and the issue objects first (2 more requests)
+
+    :param g: handle to GitHub
+    :param repo_name: name of the repo (owner + name)
+    :param number: number of the issue or PR
+    :param body: the comment (markdown)
+    :return: the data of the comment created
+    """
+    _, data = g.requester.requestJsonAndCheck(
+        "POST", f"/repos/{repo_name}/issues/{number}/comments", input={"body": body}
+    )
+    return data
+
+
+def pace_rate_limit(g: Github, min_remaining=GH_PACE_THRESHOLD, logger=logging):
+    """
+    Wait before the next request if few GitHub API requests are left, so the
+    budget left is spread until the rate limit is reset
+
+    It uses the rate limit reported in the headers of the last response, so it
+    costs no request; requests rejected by a secondary rate limit (403/429 with
+    Retry-After) are already retried by PyGithub.
+
+    :param g: handle to GitHub
+    :param min_remaining: start waiting when fewer than these requests are left
+    :param logger: the logger to use
+    """
+    remaining, _ = g.rate_limiting
+    if remaining >= min_remaining:
+        return
+    wait = (g.rate_limiting_resettime - time.time()) / max(remaining, 1)
+    if wait > 0:
+        logger.info(
+            f"Only {remaining} GitHub API requests left, waiting {wait:.0f} seconds..."
+        )
+        time.sleep(wait)
 
 
 def get_tag_info(repo: git.Repo, tag_str="head"):
@@ -94,3 +391,16 @@ def get_tag_info(repo: git.Repo, tag_str="head"):
 
 def get_time_now():
     return datetime.datetime.now(tz=TIMEZONE).strftime("%Y-%m-%d-%H-%M-%S")
+
+
+def backup_file(file_path: str, logger=logging):
+    """
+    Rename a file, if it exists, adding the current time, so it is not overwritten
+
+    :param file_path: the file to back up
+    :param logger: the logger to use
+    """
+    if os.path.exists(file_path):
+        logger.info(f"Backing up {file_path}...")
+        time_now = get_time_now()
+        os.rename(file_path, f"{file_path}-{time_now}.bak")